@@ -2,43 +2,178 @@
 from __future__ import annotations
 import time
 import asyncio
-from typing import Any, Callable, Dict, Tuple, Optional
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple, Optional
+
+from app.metrics import metrics
+
+# byte -> byte >> 1, used to age every sketch counter in one C-level pass
+_HALVE = bytes(i >> 1 for i in range(256))
+
+
+class _FrequencySketch:
+    """
+    4-row Count-Min Sketch with saturating 4-bit counters (TinyLFU frequency estimate).
+    Owners call `age()` periodically to halve every counter so old popularity fades out.
+    """
+    DEPTH = 4
+    MAX_COUNT = 15
+
+    def __init__(self, capacity: int):
+        width = 16
+        while width < 4 * max(capacity, 1):
+            width <<= 1
+        self._mask = width - 1
+        self._width = width
+        self._table = array("B", bytes(width * self.DEPTH))
+
+    def _indexes(self, key: Any):
+        # spread the hash so small ints / similar keys land on independent rows
+        h = (hash(key) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        for i in range(self.DEPTH):
+            yield i * self._width + ((h >> (i * 16)) & self._mask)
+
+    def increment(self, key: Any):
+        table = self._table
+        for idx in self._indexes(key):
+            if table[idx] < self.MAX_COUNT:
+                table[idx] += 1
+
+    def age(self):
+        self._table = array("B", self._table.tobytes().translate(_HALVE))
+
+    def frequency(self, key: Any) -> int:
+        table = self._table
+        return min(table[idx] for idx in self._indexes(key))
+
+
+class _Shard:
+    """
+    One independently locked LRU segment of a TTLCache, with its own TinyLFU sketch.
+    """
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        # key -> (expiry, value); insertion order doubles as recency order (oldest first)
+        self.store: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self.sketch = _FrequencySketch(max_items)
+        self.inserts = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[Any]:
+        self.sketch.increment(key)
+        item = self.store.get(key)
+        if not item:
+            metrics.inc("cache.miss")
+            return None
+        exp, val = item
+        if exp < time.monotonic():
+            self.store.pop(key, None)
+            metrics.inc("cache.miss")
+            return None
+        try:
+            self.store.move_to_end(key)
+        except KeyError:
+            # evicted by a concurrent writer; the value we read is still valid
+            pass
+        metrics.inc("cache.hit")
+        return val
+
+    def set(self, key: Any, val: Any, ttl: float):
+        now = time.monotonic()
+        with self.lock:
+            # reclaim expired entries sitting at the LRU head
+            while self.store and self.store[next(iter(self.store))][0] < now:
+                self.store.popitem(last=False)
+            if key not in self.store and len(self.store) >= self.max_items:
+                victim = next(iter(self.store))
+                if self.sketch.frequency(key) < self.sketch.frequency(victim):
+                    metrics.inc("cache.admit_reject")
+                    return
+                self.store.popitem(last=False)
+            self.store[key] = (now + ttl, val)
+            self.store.move_to_end(key)
+            self.inserts += 1
+            if self.inserts >= self.max_items:
+                self.sketch.age()
+                self.inserts = 0
+
 
 class TTLCache:
     """
-    Simple async-safe TTL cache with best-effort LRU eviction.
+    Simple thread-safe TTL cache with O(1) LRU eviction and TinyLFU admission.
     Keys must be hashable. Values are arbitrary JSON-serializable or strings.
+    Reads are lock-free (a stale read is harmless for a TTL cache); only writes take a lock.
+    When full, a new key only displaces the LRU victim if it has been requested at least as
+    often, so bursts of one-off queries cannot flush popular entries.
+    Keys are spread over up to `shards` independently locked segments (each holding
+    max_items // shards entries) so concurrent writers rarely contend.
     """
-    def __init__(self, max_items: int = 1024, ttl_seconds: int = 600):
+    # keep at least this many entries per shard so small caches still behave like one LRU
+    MIN_SHARD_ITEMS = 32
+
+    def __init__(self, max_items: int = 1024, ttl_seconds: int = 600, shards: int = 16):
         self.max_items = max_items
         self.ttl = ttl_seconds
-        self._store: Dict[Any, Tuple[float, Any]] = {}
-        self._touch: Dict[Any, float] = {}
-        self._lock = asyncio.Lock()
-
-    async def get(self, key: Any) -> Optional[Any]:
-        async with self._lock:
-            item = self._store.get(key)
-            if not item:
-                return None
-            exp, val = item
-            if exp < time.time():
-                self._store.pop(key, None)
-                self._touch.pop(key, None)
-                return None
-            self._touch[key] = time.time()
+        n = 1
+        while n * 2 <= shards and max_items // (n * 2) >= self.MIN_SHARD_ITEMS:
+            n *= 2
+        self._mask = n - 1
+        self._shards = [_Shard(max(max_items // n, 1)) for _ in range(n)]
+        # key -> future of the fetch currently filling it (event-loop thread only)
+        self._inflight: Dict[Any, asyncio.Future] = {}
+
+    def _shard(self, key: Any) -> _Shard:
+        return self._shards[hash(key) & self._mask]
+
+    def __len__(self) -> int:
+        return sum(len(sh.store) for sh in self._shards)
+
+    def get(self, key: Any) -> Optional[Any]:
+        return self._shard(key).get(key)
+
+    def set(self, key: Any, val: Any):
+        self._shard(key).set(key, val, self.ttl)
+
+    async def get_or_fetch(
+        self, key: Any, factory: Callable[[], Awaitable[Any]], metric: Optional[str] = None
+    ) -> Any:
+        """
+        Single-flight read-through: on a miss, `factory()` runs once in a detached task that
+        caches its result; every concurrent caller for the same key (the first included) awaits
+        that task through a shield, so cancelling any one caller never cancels the shared fetch
+        for the others. `metric` names the cache.hit/miss/coalesced.<metric> counters.
+        No lock needed: check-and-register happens without an await, so it is atomic on the loop.
+        """
+        val = self.get(key)
+        if val is not None:
+            if metric:
+                metrics.inc(f"cache.hit.{metric}")
             return val
 
-    async def set(self, key: Any, val: Any):
-        async with self._lock:
-            if len(self._store) >= self.max_items:
-                # evict stale or least recently touched
-                victim = min(self._touch.items(), key=lambda kv: kv[1])[0] if self._touch else None
-                if victim in self._store:
-                    self._store.pop(victim, None)
-                    self._touch.pop(victim, None)
-            self._store[key] = (time.time() + self.ttl, val)
-            self._touch[key] = time.time()
+        task = self._inflight.get(key)
+        if task is not None:
+            if metric:
+                metrics.inc(f"cache.coalesced.{metric}")
+        else:
+            if metric:
+                metrics.inc(f"cache.miss.{metric}")
+            task = asyncio.get_running_loop().create_task(self._fill(key, factory))
+            self._inflight[key] = task  # also the strong ref that keeps the task alive
+            task.add_done_callback(lambda t, key=key: self._fetch_done(key, t))
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: Any, factory: Callable[[], Awaitable[Any]]) -> Any:
+        val = await factory()
+        self.set(key, val)
+        return val
+
+    def _fetch_done(self, key: Any, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved so failures nobody awaited don't log "never retrieved"
 
 # singleton cache instances
 default_cache = TTLCache(max_items=2048, ttl_seconds=600)  # 10 minutes
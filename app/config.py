@@ -10,5 +10,8 @@ class Settings(BaseModel):
     ncbi_api_key: str | None = os.getenv("NCBI_API_KEY")
     ncbi_email: str | None = os.getenv("NCBI_EMAIL")
     ncbi_tool: str  | None = os.getenv("NCBI_TOOL", "pubmed-gpt-app")
+    # embedding micro-batching: flush after this many texts or this long, whichever comes first
+    emb_batch_max: int = int(os.getenv("EMB_BATCH_MAX", "256"))
+    emb_batch_wait_ms: float = float(os.getenv("EMB_BATCH_WAIT_MS", "15"))
 
 settings = Settings()
@@ -1,15 +1,39 @@
 from __future__ import annotations
-from typing import List, Optional
+import asyncio
+import hashlib
+from typing import List, NamedTuple, Optional, Set, Tuple, Union
 import httpx
 import numpy as np
+from app.cache import TTLCache, default_cache
 from app.config import settings
+from app.pool import LoopBound
 
 # You can swap this with a larger model later for quality
 _EMBEDDING_MODEL = "text-embedding-3-small"
 
+# Shared pooled client: keeps the TLS session to api.openai.com alive across calls.
+# Built lazily and bound to its event loop (like app.ncbi.get_client): rebuilt after aclose()
+# or on a new loop, and closed on its own loop when that loop shuts down.
+_client: LoopBound[httpx.AsyncClient] = LoopBound(
+    lambda: httpx.AsyncClient(
+        http2=True,
+        timeout=60,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+    )
+)
+
+def _get_client() -> httpx.AsyncClient:
+    return _client.get()
+
+async def aclose():
+    """Close the pooled HTTP client (called from the app lifespan); the next call builds a new one."""
+    await _client.aclose()
+
 async def embed_texts(texts: List[str]) -> Optional[np.ndarray]:
     """
-    Returns an array of shape (N, D) or None if embedding is unavailable.
+    Returns an L2-normalized float16 array of shape (N, D) or None if embedding is unavailable.
+    Unit-norm components lie in [-1, 1], so half precision is safe and halves memory;
+    similarity is computed after upcasting (see cosine_to_query).
     """
     if not settings.openai_api_key:
         return None
@@ -17,17 +41,225 @@ async def embed_texts(texts: List[str]) -> Optional[np.ndarray]:
     headers = {"Authorization": f"Bearer {settings.openai_api_key}"}
     payload = {"model": _EMBEDDING_MODEL, "input": texts}
     try:
-        async with httpx.AsyncClient(timeout=60) as c:
-            r = await c.post(url, headers=headers, json=payload)
-            r.raise_for_status()
-            data = r.json()["data"]
-            mat = np.array([row["embedding"] for row in data], dtype=float)
-            return mat
+        r = await _get_client().post(url, headers=headers, json=payload)
+        r.raise_for_status()
+        data = r.json()["data"]
+        mat = np.array([row["embedding"] for row in data], dtype=np.float32)
+        # normalize once at ingest so similarity is a plain dot product
+        return l2_normalize_inplace(mat).astype(np.float16)
     except Exception:
         # Fail closed to BM25-only mode
         return None
 
-def cosine_matrix(q: np.ndarray, M: np.ndarray) -> np.ndarray:
-    qn = q / (np.linalg.norm(q, axis=1, keepdims=True) + 1e-9)
-    Mn = M / (np.linalg.norm(M, axis=1, keepdims=True) + 1e-9)
-    return np.einsum("id,jd->ij", qn, Mn)  # (n_queries x n_docs)
+class BatchingEmbedder:
+    """
+    Coalesces concurrent embed requests into few upstream embeddings calls.
+    The first submit() arms a flush timer of `max_wait_ms`; texts submitted before it fires
+    (or until `max_batch` texts are pending) are embedded together in calls of at most
+    `max_batch` texts, and each caller gets back its own rows. A failed upstream call resolves
+    the callers whose texts it carried to None, like embed_texts.
+    """
+    def __init__(self, max_batch: int = 256, max_wait_ms: float = 15.0):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._pending_texts = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()  # strong refs to in-flight batch calls
+        # pending futures and the timer belong to one event loop (see submit)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def submit(self, texts: List[str]) -> Optional[np.ndarray]:
+        if not texts:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # a previous loop ended with a batch pending: its timer will never fire and its
+            # futures can't be resolved from here, so start over on this loop
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+            self._pending, self._pending_texts = [], 0
+            self._tasks = set()
+            self._loop = loop
+        fut = loop.create_future()
+        self._pending.append((list(texts), fut))
+        self._pending_texts += len(texts)
+        if self._pending_texts >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_texts = self._pending, [], 0
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _plan(self, batch: List[Tuple[List[str], asyncio.Future]]):
+        """
+        Pack the callers' texts into upstream windows of at most `max_batch` texts.
+        A caller is never split unless it alone exceeds `max_batch`; such a caller gets windows
+        of its own, so if its oversized input is rejected upstream the other callers still embed.
+        Returns (windows, places) where places[i] lists (window, start, end) spans of caller i.
+        """
+        windows: List[List[str]] = []
+        places: List[List[Tuple[int, int, int]]] = []
+        cur: List[str] = []
+
+        def close():
+            nonlocal cur
+            if cur:
+                windows.append(cur)
+                cur = []
+
+        for texts, _ in batch:
+            if len(cur) + len(texts) > self.max_batch:
+                close()
+            spans = []
+            for i in range(0, len(texts), self.max_batch):
+                piece = texts[i:i + self.max_batch]
+                if len(cur) + len(piece) > self.max_batch:
+                    close()
+                spans.append((len(windows), len(cur), len(cur) + len(piece)))
+                cur.extend(piece)
+            if len(texts) > self.max_batch:
+                close()
+            places.append(spans)
+        close()
+        return windows, places
+
+    async def _run(self, batch: List[Tuple[List[str], asyncio.Future]]):
+        try:
+            windows, places = self._plan(batch)
+            results = await asyncio.gather(*(embed_texts(w) for w in windows))
+            for (_, fut), spans in zip(batch, places):
+                if fut.done():  # the caller may have been cancelled meanwhile
+                    continue
+                if any(results[w] is None for w, _, _ in spans):
+                    fut.set_result(None)
+                elif len(spans) == 1:
+                    w, a, b = spans[0]
+                    fut.set_result(results[w][a:b])
+                else:
+                    fut.set_result(np.concatenate([results[w][a:b] for w, a, b in spans]))
+        except Exception:
+            pass  # fail closed like embed_texts: unresolved callers get None below
+        finally:
+            # never leave a caller waiting: anything unresolved (error, cancellation) gets None
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_result(None)
+
+batching_embedder = BatchingEmbedder(settings.emb_batch_max, settings.emb_batch_wait_ms)
+
+async def embed_query(text: str) -> Optional[np.ndarray]:
+    """
+    Normalized (D,) embedding for a single query string, cached so repeated questions
+    (e.g. re-ranking the same term with different weights) skip the embeddings roundtrip.
+    Returns None if embedding is unavailable; failures are not cached.
+    """
+    key = ("embed.query", _EMBEDDING_MODEL, text)
+    vec = default_cache.get(key)
+    if vec is not None:
+        return vec
+    embs = await batching_embedder.submit([text])
+    if embs is None:
+        return None
+    vec = embs[0].copy()  # own buffer: don't pin the rest of a coalesced batch in the cache
+    vec.setflags(write=False)  # shared across requests
+    default_cache.set(key, vec)
+    return vec
+
+class QuantizedRows(NamedTuple):
+    """
+    int8 embedding rows with one float32 scale per row: row i ~= codes[i] * scales[i].
+    Scaling by each row's own max |component| keeps ~8 bits of resolution per row
+    (a fixed 1/127 scale would leave unit-norm D=1536 components only a few levels).
+    """
+    codes: np.ndarray   # (N, D) int8
+    scales: np.ndarray  # (N,) float32
+
+    def dequantize(self) -> np.ndarray:
+        return self.codes.astype(np.float32) * self.scales[:, None]
+
+def quantize_rows_int8(M: np.ndarray) -> QuantizedRows:
+    """Symmetric per-row int8 quantization of an (N, D) float array."""
+    M = M.astype(np.float32, copy=False)
+    scales = np.abs(M).max(axis=1) / 127.0
+    np.clip(scales, 1e-12, None, out=scales)
+    codes = np.rint(M / scales[:, None]).astype(np.int8)
+    return QuantizedRows(codes, scales.astype(np.float32, copy=False))
+
+# Per-text embedding rows (~1.5 KB each as int8 codes + scale); embeddings are deterministic
+# per model, so entries live long and the bound is on memory, not staleness.
+_vectors = TTLCache(max_items=8192, ttl_seconds=24 * 3600)
+
+def _text_key(text: str) -> Tuple[str, bytes]:
+    # 16-byte digest instead of the chunk text itself keeps cache keys small
+    return _EMBEDDING_MODEL, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+async def embed_cached(texts: List[str]) -> Optional[QuantizedRows]:
+    """
+    Embeds like embed_texts, but returns rows stored as int8 (see QuantizedRows); they are
+    scored in float32 by cosine_to_query. Rows embedded recently are served from a per-text cache and only
+    the misses go upstream (through the batching embedder). None if embedding is unavailable.
+    """
+    if not texts or not settings.openai_api_key:
+        return None
+    keys = [_text_key(t) for t in texts]
+    rows = [_vectors.get(k) for k in keys]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if missing:
+        embs = await batching_embedder.submit([texts[i] for i in missing])
+        if embs is None:
+            return None
+        quant = quantize_rows_int8(embs)
+        for j, i in enumerate(missing):
+            codes = quant.codes[j].copy()  # own buffer, as in embed_query
+            codes.setflags(write=False)
+            row = (codes, float(quant.scales[j]))
+            _vectors.set(keys[i], row)
+            rows[i] = row
+    return QuantizedRows(
+        np.stack([codes for codes, _ in rows]),
+        np.fromiter((scale for _, scale in rows), dtype=np.float32, count=len(rows)),
+    )
+
+def l2_normalize_inplace(M: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize rows of M in place (and return it). Row norms come from a fused
+    einsum reduction, so no squared-matrix or division temporaries are allocated.
+    """
+    norms = np.sqrt(np.einsum("ij,ij->i", M, M))[:, None]
+    np.clip(norms, 1e-9, None, out=norms)
+    M /= norms
+    return M
+
+# Rows widened to float32 per scoring step (~6 MB scratch at D=1536), so the temporary
+# stays bounded however many chunks are scored.
+_SCORE_BLOCK = 1024
+
+def cosine_to_query(q: np.ndarray, M: Union[np.ndarray, QuantizedRows]) -> np.ndarray:
+    """
+    Cosine similarity of one L2-normalized query vector against normalized rows of M,
+    returning a flat (n_docs,) float32 array via BLAS SGEMV.
+    QuantizedRows are stored as int8 but scored in float32: codes are widened block by block
+    (far cheaper than float16 upcasting) and each row's dot product is rescaled afterwards;
+    the query stays float.
+    """
+    q32 = q.astype(np.float32, copy=False)
+    if isinstance(M, QuantizedRows):
+        codes = M.codes
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _SCORE_BLOCK):
+            stop = start + _SCORE_BLOCK
+            out[start:stop] = codes[start:stop].astype(np.float32) @ q32
+        out *= M.scales
+        return out
+    return M.astype(np.float32, copy=False) @ q32
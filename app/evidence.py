@@ -1,6 +1,6 @@
 # app/evidence.py
 from __future__ import annotations
-from typing import List, Optional
+from typing import FrozenSet, Iterable, List, Optional
 
 _CANON = {
     "Randomized Controlled Trial": "RCT",
@@ -18,6 +18,19 @@ _CANON = {
     "Editorial": "Editorial",
 }
 
+# Highest-priority evidence label wins when a record carries several pubtypes
+_PRIORITY = ("RCT", "Meta-analysis", "Systematic review", "Cohort", "Case-control",
+             "Cross-sectional", "Clinical trial", "Observational", "Comparative",
+             "Multicenter", "Review", "Editorial", "Letter")
+_RANK = {tag: i for i, tag in enumerate(_PRIORITY)}
+
+# Lowercased title substrings that imply an evidence label
+_TITLE_HINTS = (
+    ("systematic review", "Systematic review"),
+    ("meta-analysis", "Meta-analysis"),
+    ("meta analysis", "Meta-analysis"),
+)
+
 # Prefer high-signal sections when ranking PMC full text
 SECTION_WEIGHTS = {
     "Results": 1.20,
@@ -32,30 +45,34 @@ def classify_study_type(pubtypes: List[str], title: str = "") -> str:
     Map PubMed pubtypes (and sometimes title hints) to a concise evidence label.
     Picks the highest-priority match when multiple types are present.
     """
-    priority = ["RCT", "Meta-analysis", "Systematic review", "Cohort", "Case-control",
-                "Cross-sectional", "Clinical trial", "Observational", "Comparative",
-                "Multicenter", "Review", "Editorial", "Letter"]
-    found = set()
+    best = None
+    best_rank = len(_PRIORITY)
     for pt in pubtypes or []:
-        if pt in _CANON:
-            found.add(_CANON[pt])
-    tl = (title or "").lower()
-    if "systematic review" in tl:
-        found.add("Systematic review")
-    if "meta-analysis" in tl or "meta analysis" in tl:
-        found.add("Meta-analysis")
-    for tag in priority:
-        if tag in found:
-            return tag
-    return "Unspecified"
+        c = _CANON.get(pt)
+        if c and _RANK[c] < best_rank:
+            best, best_rank = c, _RANK[c]
+    if title and best_rank > _RANK["Meta-analysis"]:
+        # title hints can only improve on anything ranked below them
+        tl = title.lower()
+        for hint, tag in _TITLE_HINTS:
+            if _RANK[tag] < best_rank and hint in tl:
+                best, best_rank = tag, _RANK[tag]
+    return best or "Unspecified"
+
+def normalize_prefs(prefer_types: Iterable[str] | None) -> FrozenSet[str]:
+    """
+    Lowercase/trim preferred study types once so ranking loops can reuse the set.
+    """
+    return frozenset(t.strip().lower() for t in prefer_types or [])
 
-def preference_boost(study_type: str, prefer_types: List[str] | None) -> float:
+def preference_boost(study_type: str, prefer_types: List[str] | FrozenSet[str] | None) -> float:
     """
     Multiplicative boost for preferred study types (e.g., RCT, Meta-analysis).
+    Accepts raw names or a pre-normalized frozenset from normalize_prefs().
     """
     if not prefer_types:
         return 1.0
-    norm = {t.strip().lower() for t in prefer_types}
+    norm = prefer_types if isinstance(prefer_types, frozenset) else normalize_prefs(prefer_types)
     return 1.2 if study_type.lower() in norm else 1.0
 
 def section_boost(section: str) -> float:
@@ -1,32 +1,33 @@
 # app/main.py
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from app.config import settings
 from app.__about__ import __app_name__, __version__
 from app.routers_pubmed import router as pubmed_router
 from app.routers_answer import router as answer_router
 from app.metrics import metrics
-import time
+from app.obs import RequestObservability
+from app import embedding, ncbi
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # release pooled upstream connections (NCBI E-utilities and OpenAI)
+    await ncbi.aclose_client()
+    await embedding.aclose()
 
 app = FastAPI(
     title="PubMed-Grounded GPT",
     version=__version__,
     description="Retrieval-first literature assistant (PubMed/PMC → GPT).",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# ---------------------- Middleware (compatible with simple metrics.py) ----------------------
-@app.middleware("http")
-async def metrics_middleware(request: Request, call_next):
-    start = time.perf_counter()
-    try:
-        response = await call_next(request)
-        return response
-    finally:
-        ms = (time.perf_counter() - start) * 1000.0
-        path = request.url.path
-        method = request.method
-        metrics.inc("http.requests.total")
-        # per-route latency key; safe for dev (in prod, consider path templating)
-        metrics.observe_ms(f"http.latency.{method}.{path}", ms)
+# ---------------------- Middleware ----------------------
+# per-request metrics (count + route-templated latency) and one structured log line
+app.add_middleware(RequestObservability)
 
 # ---------------------- Health endpoint ----------------------
 @app.get("/health")
@@ -1,54 +1,105 @@
 # app/metrics.py
 from __future__ import annotations
 import time
+import bisect
 import threading
+from array import array
 from collections import defaultdict
 from typing import Dict, List
 
+class _P2Quantile:
+    """
+    Jain & Chlamtac P² streaming quantile estimator: O(1) memory and time per observation.
+    Keeps five markers (min, p/2, p, (1+p)/2, max) and adjusts them with parabolic interpolation.
+    """
+    def __init__(self, p: float):
+        self.p = p
+        self.q: List[float] = []                      # marker heights
+        self.n = [0, 1, 2, 3, 4]                      # actual marker positions
+        self.np = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]  # desired marker positions
+        self.dn = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+    def add(self, x: float):
+        q, n = self.q, self.n
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self.dn[i]
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    # parabolic estimate left the bracket → fall back to linear
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+    def value(self) -> float:
+        q = self.q
+        if not q:
+            return 0.0
+        if len(q) < 5:
+            return q[int(self.p * (len(q) - 1))]
+        return q[2]
+
 class _Histogram:
     # fixed buckets in ms (log-spaced)
     BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2000, 5000, 10000]
     def __init__(self):
-        self.counts = [0]*len(self.BUCKETS)
+        self.counts = array("Q", [0]*len(self.BUCKETS))
+        # guards only the multi-field P² update; bucket counts are bumped without locking
         self.lock = threading.Lock()
-        self._samples: List[float] = []  # keep short tail to approximate p95
+        self._p95 = _P2Quantile(0.95)  # streaming p95, no sample buffer to sort
     def observe_ms(self, ms: float):
-        i = 0
-        while i < len(self.BUCKETS) and ms > self.BUCKETS[i]:
-            i += 1
+        # first bucket whose bound is >= ms; values past the last bound land in the overflow (last) bucket
+        i = min(bisect.bisect_left(self.BUCKETS, ms), len(self.BUCKETS) - 1)
+        self.counts[i] += 1
         with self.lock:
-            if i < len(self.BUCKETS):
-                self.counts[i] += 1
-            else:
-                # overflow
-                self.counts[-1] += 1
-            # keep a rolling window of last 200 samples for p95
-            self._samples.append(ms)
-            if len(self._samples) > 200:
-                self._samples = self._samples[-200:]
+            self._p95.add(ms)
     def p95_ms(self) -> float:
         with self.lock:
-            if not self._samples:
-                return 0.0
-            arr = sorted(self._samples)
-            idx = int(0.95 * (len(arr)-1))
-            return arr[idx]
+            return self._p95.value()
 
 class Metrics:
+    # hard cap on distinct histogram keys; new keys past it are dropped (counted in metrics.dropped)
+    MAX_KEYS = 512
     def __init__(self):
+        # Counters are updated without a lock: requests run on the event loop, and a rare
+        # lost increment from a threadpool endpoint is acceptable for ops metrics.
         self.counters: Dict[str, int] = defaultdict(int)
         self.histos: Dict[str, _Histogram] = defaultdict(_Histogram)
-        self.lock = threading.Lock()
         self.process_start_ns = time.time_ns()
     def inc(self, key: str, n: int = 1):
-        with self.lock:
-            self.counters[key] += n
+        self.counters[key] += n
     def observe_ms(self, key: str, ms: float):
-        self.histos[key].observe_ms(ms)
+        h = self.histos.get(key)
+        if h is None:
+            if len(self.histos) >= self.MAX_KEYS:
+                self.inc("metrics.dropped")
+                return
+            h = self.histos[key]
+        h.observe_ms(ms)
     def snapshot(self) -> Dict:
         up_ms = (time.time_ns() - self.process_start_ns) / 1e6
         out = {"uptime_ms": up_ms, "counters": dict(self.counters), "latency_p95_ms": {}}
-        for k, h in self.histos.items():
+        for k, h in list(self.histos.items()):
             out["latency_p95_ms"][k] = h.p95_ms()
         return out
 
@@ -1,19 +1,195 @@
 # app/ncbi.py
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import io
 import time
 import re
-from typing import Any, Dict, List, Optional
+import threading
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 import httpx
+import orjson
 from lxml import etree
-from tenacity import retry, wait_exponential_jitter, stop_after_attempt
+from tenacity import retry, retry_if_exception, stop_after_attempt, stop_after_delay, wait_exponential_jitter
 
+from app.config import settings
 from app.metrics import metrics
+from app.pool import LoopBound
 from app.cache import default_cache, short_cache
 
 EUTILS_BASE = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
 
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+_PMC_ID_RE = re.compile(r"PMC?(\d+)", re.IGNORECASE)
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """Retry transport failures, 5xx and 429 (rate limited); other 4xx won't succeed on retry."""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        code = exc.response.status_code
+        return code >= 500 or code == 429
+    return False
+
+
+# At most 3 attempts and 15s per call, so a flaky upstream can't pin a pooled connection for long
+_retry = retry(
+    wait=wait_exponential_jitter(initial=0.3, max=4),
+    stop=stop_after_attempt(3) | stop_after_delay(15),
+    retry=retry_if_exception(_is_retryable),
+)
+
+# lxml parsers are not safe for concurrent use, so keep one reusable parser per thread
+_parsers = threading.local()
+
+
+def _normalize_ids(ids: List[str]) -> List[str]:
+    """NCBI responses don't depend on id order, so sort + dedupe to share cache entries."""
+    return sorted(set(ids))
+
+
+def _ids_key(prefix: str, ids: List[str]) -> Tuple[str, str]:
+    """Fixed-size cache key for an id list (callers pass normalized ids, so order never matters)."""
+    return prefix, hashlib.blake2b(",".join(ids).encode(), digest_size=16).hexdigest()
+
+
+# Selectors compiled once; PMID is the first one in document order (MedlineCitation/PMID).
+# smart_strings=False: plain str results don't pin the parsed tree via a parent reference.
+_PMID_XP = etree.XPath("string(.//PMID)", smart_strings=False)
+_ABSTRACT_TEXT_XP = etree.XPath(".//Abstract/AbstractText")
+_LINKSET_XP = etree.XPath(".//LinkSet")
+_LINK_PMID_XP = etree.XPath("string(.//IdList/Id)", smart_strings=False)
+_LINK_PMCID_XP = etree.XPath("string(.//LinkSetDb[LinkName='pubmed_pmc']/Link/Id)", smart_strings=False)
+
+
+def _release(el: etree._Element):
+    """Free a fully-processed iterparse element and the already-seen siblings before it."""
+    el.clear()
+    parent = el.getparent()
+    if parent is not None:
+        while el.getprevious() is not None:
+            del parent[0]
+
+
+def _collect_abstracts(events: Iterable[Tuple[str, etree._Element]], out: Dict[str, str]):
+    """Fill { pmid -> abstract } from <PubmedArticle> end events, freeing each article once read."""
+    for _, art in events:
+        pmid = _PMID_XP(art)
+        if pmid:
+            nodes = _ABSTRACT_TEXT_XP(art)
+            out[pmid] = "\n".join("".join(n.itertext()).strip() for n in nodes).strip()
+        _release(art)
+
+
+def _xml_bytes(xml: str | bytes) -> bytes:
+    """Parsers take the raw response bytes; str input (e.g. tests) is encoded as UTF-8."""
+    return xml if isinstance(xml, bytes) else xml.encode("utf-8")
+
+
+def _xml_parser() -> etree.XMLParser:
+    parser = getattr(_parsers, "parser", None)
+    if parser is None:
+        parser = etree.XMLParser(recover=True, huge_tree=True, collect_ids=False, resolve_entities=False)
+        _parsers.parser = parser
+    return parser
+
+
+# PMC section buckets, matched against @sec-type or the section's own <title>
+_PMC_WANTED = ("results", "methods", "discussion", "conclusion", "limitations")
+
+
+class _PMCSectionTarget:
+    """
+    lxml parser target (SAX-style callbacks) for PMC NXML section extraction.
+    No element tree is built: only the open-element stack and the text of the <p>,
+    section <title> and id elements being read are kept, so memory stays flat in document size.
+    close() returns { pmcid -> {SectionName -> text} }.
+    """
+    def __init__(self):
+        self.out: Dict[str, Dict[str, str]] = {}
+        self._depth = 0  # <article> nesting (recover mode can nest a stray trailing article)
+        # one entry per open element: (local name, whether it pushed a text buffer)
+        self._open: List[Tuple[str, bool]] = []
+        self._bufs: List[List[str]] = []
+        self._id_type = ""
+        self._reset()
+
+    def _reset(self):
+        self._buckets: Dict[str, List[str]] = {k.capitalize(): [] for k in _PMC_WANTED}
+        self._article_ids: List[Tuple[str, str]] = []  # (pub-id-type, text)
+        self._other_ids: List[str] = []
+        # one entry per open <sec>: [bucket name or None, paragraph texts]
+        self._secs: List[list] = []
+
+    def start(self, tag: str, attrib):
+        name = tag.rpartition("}")[2]  # namespace-agnostic
+        capture = False
+        if name == "p":
+            capture = True
+        elif name == "title":
+            # Only a section's own heading names it (not figure/table captions)
+            capture = bool(self._open) and self._open[-1][0] == "sec" and self._secs[-1][0] is None
+        elif name == "sec":
+            # Prefer @sec-type if present; the <title> may still name it below
+            sec_type = (attrib.get("sec-type") or "").strip().lower()
+            self._secs.append([sec_type if sec_type in _PMC_WANTED else None, []])
+        elif name == "article-id":
+            self._id_type = (attrib.get("pub-id-type") or "").lower()
+            capture = True
+        elif name == "id":
+            capture = True
+        elif name == "article":
+            if self._depth == 0:
+                self._reset()
+            self._depth += 1
+        if capture:
+            self._bufs.append([])
+        self._open.append((name, capture))
+
+    def data(self, text: str):
+        if self._bufs:
+            self._bufs[-1].append(text)
+
+    def end(self, tag: str):
+        name, captured = self._open.pop()
+        text = "".join(self._bufs.pop()) if captured else ""
+        if name == "p":
+            # Attach to the nearest enclosing section that maps to a wanted bucket
+            owner = next((sec for sec in reversed(self._secs) if sec[0]), None)
+            text = text.strip()
+            if owner is not None and text:
+                owner[1].append(text)
+        elif name == "title":
+            if captured:
+                title_txt = " ".join(text.split()).lower()
+                self._secs[-1][0] = next((w for w in _PMC_WANTED if w in title_txt), None)
+        elif name == "sec":
+            if self._secs:
+                chosen, paras = self._secs.pop()
+                if chosen and paras:
+                    self._buckets[chosen.capitalize()].append(" ".join(paras))
+        elif name == "article-id":
+            self._article_ids.append((self._id_type, text.strip()))
+        elif name == "id":
+            if text.strip():
+                self._other_ids.append(text.strip())
+        elif name == "article":
+            self._depth -= 1
+            if self._depth > 0:
+                return
+            pmcid = NCBIClient._pick_pmcid(self._article_ids, self._other_ids)
+            if pmcid:
+                # Materialize only non-empty sections
+                realized = {k: "\n".join(v).strip() for k, v in self._buckets.items() if v}
+                if realized:
+                    self.out[pmcid] = realized
+
+    def close(self) -> Dict[str, Dict[str, str]]:
+        return self.out
+
 
 class NCBIClient:
     """
@@ -22,13 +198,32 @@ class NCBIClient:
     - Retries with jittered exponential backoff on transient failures
     - Caches common calls (ESearch/ESummary/EFetch/Elink) with TTL
     - Emits lightweight metrics for ops visibility
+    - Owns one pooled HTTP/2 client so chained calls reuse the TCP/TLS connection;
+      build one instance per app and close it with aclose()
     """
 
     def __init__(self, api_key: Optional[str], email: Optional[str], tool: Optional[str]):
         self.api_key = api_key or ""
         self.email = email or ""
         self.tool = tool or "pubmed-gpt-app"
-        self.headers = {"User-Agent": f"{self.tool} ({self.email})"}
+        # EFetch XML (PMC NXML especially) compresses >10x; httpx inflates it transparently
+        self.headers = {"User-Agent": f"{self.tool} ({self.email})", "Accept-Encoding": "gzip, deflate"}
+        self._client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            headers=self.headers,
+            timeout=httpx.Timeout(30.0, read=60.0),
+        )
+
+    async def aclose(self):
+        """Close the pooled HTTP client."""
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "NCBIClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
 
     # ----------------------------- internals -----------------------------
 
@@ -38,17 +233,18 @@ class NCBIClient:
             base["api_key"] = self.api_key
         return base
 
-    @retry(wait=wait_exponential_jitter(initial=0.5, max=8), stop=stop_after_attempt(5))
-    async def _get_json(self, client: httpx.AsyncClient, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        r = await client.get(url, params={**self._params_core(), **params}, headers=self.headers, timeout=30)
+    @_retry
+    async def _get_json(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        r = await self._client.get(url, params={**self._params_core(), **params})
         r.raise_for_status()
-        return r.json()
+        return orjson.loads(r.content)
 
-    @retry(wait=wait_exponential_jitter(initial=0.5, max=8), stop=stop_after_attempt(5))
-    async def _get_text(self, client: httpx.AsyncClient, url: str, params: Dict[str, Any]) -> str:
-        r = await client.get(url, params={**self._params_core(), **params}, headers=self.headers, timeout=60)
+    @_retry
+    async def _get_bytes(self, url: str, params: Dict[str, Any]) -> bytes:
+        # raw body for the XML parsers: no charset sniffing / str decode, lxml reads the bytes
+        r = await self._client.get(url, params={**self._params_core(), **params})
         r.raise_for_status()
-        return r.text
+        return r.content
 
     # ----------------------------- PubMed -----------------------------
 
@@ -61,21 +257,16 @@ class NCBIClient:
         params = {"db": "pubmed", "term": term, "retmode": "json", "retmax": str(retmax), "sort": sort}
         cache_key = ("esearch", term, retmax, sort, bool(self.api_key))
 
-        t0 = time.perf_counter()
-        cached = await short_cache.get(cache_key)
-        if cached is not None:
-            metrics.inc("cache.hit.esearch")
-            return cached
+        async def fetch():
+            t0 = time.perf_counter()
+            data = await self._get_json(url, params)
+            pmids = data.get("esearchresult", {}).get("idlist", []) or []
 
-        metrics.inc("cache.miss.esearch")
-        async with httpx.AsyncClient() as c:
-            data = await self._get_json(c, url, params)
-        pmids = data.get("esearchresult", {}).get("idlist", []) or []
+            metrics.observe_ms("ncbi.esearch.ms", (time.perf_counter() - t0) * 1000)
+            metrics.inc("ncbi.esearch.count")
+            return pmids
 
-        await short_cache.set(cache_key, pmids)
-        metrics.observe_ms("ncbi.esearch.ms", (time.perf_counter() - t0) * 1000)
-        metrics.inc("ncbi.esearch.count")
-        return pmids
+        return await short_cache.get_or_fetch(cache_key, fetch, metric="esearch")
 
     async def esummary(self, pmids: List[str]) -> Dict[str, Any]:
         """
@@ -84,70 +275,92 @@ class NCBIClient:
         """
         if not pmids:
             return {}
+        pmids = _normalize_ids(pmids)
         url = EUTILS_BASE + "esummary.fcgi"
         params = {"db": "pubmed", "id": ",".join(pmids), "retmode": "json"}
-        cache_key = ("esummary", tuple(pmids), bool(self.api_key))
+        cache_key = (*_ids_key("esummary", pmids), bool(self.api_key))
 
-        t0 = time.perf_counter()
-        cached = await default_cache.get(cache_key)
-        if cached is not None:
-            metrics.inc("cache.hit.esummary")
-            return cached
+        async def fetch():
+            t0 = time.perf_counter()
+            data = await self._get_json(url, params)
+            res = data.get("result", {})
 
-        metrics.inc("cache.miss.esummary")
-        async with httpx.AsyncClient() as c:
-            data = await self._get_json(c, url, params)
-        res = data.get("result", {})
+            metrics.observe_ms("ncbi.esummary.ms", (time.perf_counter() - t0) * 1000)
+            metrics.inc("ncbi.esummary.count")
+            return res
 
-        await default_cache.set(cache_key, res)
-        metrics.observe_ms("ncbi.esummary.ms", (time.perf_counter() - t0) * 1000)
-        metrics.inc("ncbi.esummary.count")
-        return res
+        return await default_cache.get_or_fetch(cache_key, fetch, metric="esummary")
 
-    async def efetch_pubmed_xml(self, pmids: List[str]) -> str:
+    async def aiter_efetch_pubmed_xml(self, pmids: List[str]) -> AsyncIterator[bytes]:
         """
-        Fetch PubMed abstracts as XML (EFetch).
-        Cached medium TTL.
+        Stream EFetch PubMed XML as raw byte chunks as they arrive (uncached).
         """
-        if not pmids:
-            return ""
         url = EUTILS_BASE + "efetch.fcgi"
         params = {"db": "pubmed", "id": ",".join(pmids), "retmode": "xml", "rettype": "abstract"}
-        cache_key = ("efetch.pubmed", tuple(pmids))
+        async with self._client.stream("GET", url, params={**self._params_core(), **params}) as r:
+            r.raise_for_status()
+            async for chunk in r.aiter_bytes():
+                yield chunk
 
-        t0 = time.perf_counter()
-        cached = await default_cache.get(cache_key)
-        if cached is not None:
-            metrics.inc("cache.hit.efetch_pubmed")
-            return cached
+    async def parse_pubmed_abstracts_stream(self, pmids: List[str]) -> Dict[str, str]:
+        """
+        EFetch + parse in one pass: articles are parsed as bytes arrive, so neither the whole
+        XML document nor its tree is held. Returns { pmid -> abstract_text }.
+        Cached medium TTL (the parsed map, which is much smaller than the XML).
+        """
+        if not pmids:
+            return {}
+        pmids = _normalize_ids(pmids)
+        cache_key = _ids_key("efetch.pubmed.abstracts", pmids)
 
-        metrics.inc("cache.miss.efetch_pubmed")
-        async with httpx.AsyncClient() as c:
-            xml_text = await self._get_text(c, url, params)
+        async def fetch():
+            t0 = time.perf_counter()
+            out = await self._stream_abstracts(pmids)
 
-        await default_cache.set(cache_key, xml_text)
-        metrics.observe_ms("ncbi.efetch_pubmed.ms", (time.perf_counter() - t0) * 1000)
-        metrics.inc("ncbi.efetch_pubmed.count")
-        return xml_text
+            metrics.observe_ms("ncbi.efetch_pubmed_abstracts.ms", (time.perf_counter() - t0) * 1000)
+            metrics.inc("ncbi.efetch_pubmed_abstracts.count")
+            return out
+
+        return await default_cache.get_or_fetch(cache_key, fetch, metric="efetch_pubmed_abstracts")
+
+    @_retry
+    async def _stream_abstracts(self, pmids: List[str]) -> Dict[str, str]:
+        # retried as a whole: a stream that breaks mid-way restarts with a fresh parser
+        parser = etree.XMLPullParser(events=("end",), tag="PubmedArticle", recover=True, huge_tree=True)
+        out: Dict[str, str] = {}
+        try:
+            async for chunk in self.aiter_efetch_pubmed_xml(pmids):
+                parser.feed(chunk)
+                _collect_abstracts(parser.read_events(), out)
+            parser.close()
+            _collect_abstracts(parser.read_events(), out)
+        except etree.XMLSyntaxError:
+            # keep whatever articles were completed before the document broke off
+            pass
+        return out
 
     @staticmethod
-    def parse_pubmed_abstracts(xml_text: str) -> Dict[str, str]:
+    def parse_pubmed_abstracts(xml_text: str | bytes) -> Dict[str, str]:
         """
         Parse EFetch XML and return { pmid -> abstract_text }.
         Concatenates multiple <AbstractText> segments.
         """
         if not xml_text.strip():
             return {}
-        parser = etree.XMLParser(recover=True)
-        root = etree.fromstring(xml_text.encode("utf-8"), parser=parser)
         out: Dict[str, str] = {}
-        for art in root.findall(".//PubmedArticle"):
-            pmid = art.findtext(".//PMID")
-            if not pmid:
-                continue
-            nodes = art.findall(".//Abstract/AbstractText")
-            text = "\n".join(etree.tostring(n, method="text", encoding="unicode").strip() for n in nodes).strip()
-            out[pmid] = text
+        # Stream one <PubmedArticle> at a time and drop it once read: peak memory is one article
+        context = etree.iterparse(
+            io.BytesIO(_xml_bytes(xml_text)),
+            events=("end",),
+            tag="PubmedArticle",
+            recover=True,
+            huge_tree=True,
+        )
+        try:
+            _collect_abstracts(context, out)
+        except etree.XMLSyntaxError:
+            # keep whatever articles were completed before the document broke off
+            pass
         return out
 
     @staticmethod
@@ -159,7 +372,7 @@ class NCBIClient:
         def _parse_year(s: str | None) -> int | None:
             if not s:
                 return None
-            m = re.search(r"\b(19|20)\d{2}\b", s)
+            m = _YEAR_RE.search(s)
             return int(m.group(0)) if m else None
 
         recs: List[Dict[str, Any]] = []
@@ -178,6 +391,24 @@ class NCBIClient:
             })
         return recs
 
+    async def fetch_pubmed_bundle(
+        self, pmids: List[str], with_pmc: bool = True
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """
+        Fetch ESummary, EFetch (and optionally ELink→PMC) for the same PMIDs concurrently.
+        Returns (records, pmid -> pmcid map); the map is empty when with_pmc is False.
+        """
+        if not pmids:
+            return [], {}
+        if with_pmc:
+            meta, abstracts, pmc_map = await asyncio.gather(
+                self.esummary(pmids), self.parse_pubmed_abstracts_stream(pmids), self.elink_pmc(pmids)
+            )
+        else:
+            meta, abstracts = await asyncio.gather(self.esummary(pmids), self.parse_pubmed_abstracts_stream(pmids))
+            pmc_map = {}
+        return self.assemble_records(pmids, meta, abstracts), pmc_map
+
     # ----------------------------- PMC (full text) -----------------------------
 
     async def elink_pmc(self, pmids: List[str]) -> Dict[str, str]:
@@ -187,65 +418,56 @@ class NCBIClient:
         """
         if not pmids:
             return {}
+        pmids = _normalize_ids(pmids)
         url = EUTILS_BASE + "elink.fcgi"
         params = {"dbfrom": "pubmed", "linkname": "pubmed_pmc", "id": ",".join(pmids)}
-        cache_key = ("elink.pmc", tuple(pmids))
-
-        t0 = time.perf_counter()
-        cached = await default_cache.get(cache_key)
-        if cached is not None:
-            metrics.inc("cache.hit.elink_pmc")
-            return cached
-
-        metrics.inc("cache.miss.elink_pmc")
-        async with httpx.AsyncClient() as c:
-            xml = await self._get_text(c, url, params)
-
-        try:
-            parser = etree.XMLParser(recover=True)
-            root = etree.fromstring(xml.encode("utf-8"), parser=parser)
-            out: Dict[str, str] = {}
-            for ls in root.findall(".//LinkSet"):
-                pmid = ls.findtext(".//IdList/Id")
-                pmc_id = ls.findtext(".//LinkSetDb[LinkName='pubmed_pmc']/Link/Id")
-                if pmid and pmc_id:
-                    out[pmid] = pmc_id  # numeric part (e.g., '1234567')
-        except Exception:
-            out = {}
-
-        await default_cache.set(cache_key, out)
-        metrics.observe_ms("ncbi.elink_pmc.ms", (time.perf_counter() - t0) * 1000)
-        metrics.inc("ncbi.elink_pmc.count")
-        return out
-
-    async def efetch_pmc_xml(self, pmcids: List[str]) -> str:
+        cache_key = _ids_key("elink.pmc", pmids)
+
+        async def fetch():
+            t0 = time.perf_counter()
+            xml = await self._get_bytes(url, params)
+
+            try:
+                root = etree.fromstring(xml, parser=_xml_parser())
+                out: Dict[str, str] = {}
+                for ls in _LINKSET_XP(root):
+                    pmid = _LINK_PMID_XP(ls)
+                    pmc_id = _LINK_PMCID_XP(ls)
+                    if pmid and pmc_id:
+                        out[pmid] = pmc_id  # numeric part (e.g., '1234567')
+            except Exception:
+                out = {}
+
+            metrics.observe_ms("ncbi.elink_pmc.ms", (time.perf_counter() - t0) * 1000)
+            metrics.inc("ncbi.elink_pmc.count")
+            return out
+
+        return await default_cache.get_or_fetch(cache_key, fetch, metric="elink_pmc")
+
+    async def efetch_pmc_xml(self, pmcids: List[str]) -> bytes:
         """
         Fetch PMC full-text NXML for a list of PMCID numbers (no 'PMC' prefix in the param).
         Cached medium TTL.
         """
         if not pmcids:
-            return ""
+            return b""
+        pmcids = _normalize_ids(pmcids)
         url = EUTILS_BASE + "efetch.fcgi"
         params = {"db": "pmc", "id": ",".join(pmcids), "retmode": "xml"}
-        cache_key = ("efetch.pmc", tuple(pmcids))
+        cache_key = _ids_key("efetch.pmc", pmcids)
 
-        t0 = time.perf_counter()
-        cached = await default_cache.get(cache_key)
-        if cached is not None:
-            metrics.inc("cache.hit.efetch_pmc")
-            return cached
+        async def fetch():
+            t0 = time.perf_counter()
+            body = await self._get_bytes(url, params)
 
-        metrics.inc("cache.miss.efetch_pmc")
-        async with httpx.AsyncClient() as c:
-            xml_text = await self._get_text(c, url, params)
+            metrics.observe_ms("ncbi.efetch_pmc.ms", (time.perf_counter() - t0) * 1000)
+            metrics.inc("ncbi.efetch_pmc.count")
+            return body
 
-        await default_cache.set(cache_key, xml_text)
-        metrics.observe_ms("ncbi.efetch_pmc.ms", (time.perf_counter() - t0) * 1000)
-        metrics.inc("ncbi.efetch_pmc.count")
-        return xml_text
+        return await default_cache.get_or_fetch(cache_key, fetch, metric="efetch_pmc")
 
     @staticmethod
-    def parse_pmc_sections(xml_text: str) -> Dict[str, Dict[str, str]]:
+    def parse_pmc_sections(xml_text: str | bytes) -> Dict[str, Dict[str, str]]:
         """
         Robustly extract high-signal sections per PMCID from PMC NXML.
 
@@ -262,91 +484,63 @@ class NCBIClient:
           }
 
         Notes:
-        - Namespace-agnostic (uses local-name()).
+        - Single pass through a parser target (no tree is built) with a stack of open <sec>s;
+          namespace-agnostic.
         - Normalizes PMCID keys to the numeric part (e.g., 'PMC12345' -> '12345').
-        - Uses <sec sec-type> and/or <title> to identify section names.
+        - Uses <sec sec-type> and/or the section's own <title> to identify section names.
+        - Paragraphs of unnamed nested sections count toward the nearest named ancestor.
         """
         if not xml_text or not xml_text.strip():
             return {}
 
+        target = _PMCSectionTarget()
+        parser = etree.XMLParser(target=target, recover=True, huge_tree=True, resolve_entities=False)
         try:
-            parser = etree.XMLParser(recover=True)
-            root = etree.fromstring(xml_text.encode("utf-8"), parser=parser)
-        except Exception:
-            return {}
-
-        wanted = ("results", "methods", "discussion", "conclusion", "limitations")
-        out: Dict[str, Dict[str, str]] = {}
+            parser.feed(_xml_bytes(xml_text))
+            return parser.close()
+        except etree.XMLSyntaxError:
+            # keep whatever articles were completed before the document broke off
+            return target.out
 
-        # Find all <article> elements regardless of namespace
-        articles = root.xpath('//*[local-name()="article"]')
-        for art in articles:
-            # Prefer article-id[@pub-id-type="pmcid"]
-            pmcid_txts = art.xpath(
-                './/*[local-name()="article-id" and translate(@pub-id-type,"PMCID","pmcid")="pmcid"]/text()'
-            )
-            pmcid: Optional[str] = None
-            if pmcid_txts:
-                pmcid = pmcid_txts[0].strip()
+    @staticmethod
+    def _pick_pmcid(article_ids: List[Tuple[str, str]], other_ids: List[str]) -> Optional[str]:
+        """
+        Resolve the numeric PMCID for one article from its collected id elements.
+        """
+        # Prefer article-id[@pub-id-type="pmcid"]
+        for id_type, text in article_ids:
+            if id_type == "pmcid" and text:
                 # normalize to numeric only
-                if pmcid.upper().startswith("PMC"):
-                    pmcid = pmcid[3:]
-            else:
-                # fallback: any article-id text like 'PMC9999999' or '9999999'
-                any_ids = [t.strip() for t in art.xpath('.//*[local-name()="article-id"]/text()') if t and t.strip()]
-                for t in any_ids:
-                    m = re.search(r"PMC?(\d+)", t, re.IGNORECASE)
-                    if m:
-                        pmcid = m.group(1)
-                        break
-
-            if not pmcid:
-                # last resort: look for any <id> text with PMC pattern
-                any_txts = [t.strip() for t in art.xpath('.//*[local-name()="id"]/text()') if t and t.strip()]
-                for t in any_txts:
-                    m = re.search(r"PMC?(\d+)", t, re.IGNORECASE)
-                    if m:
-                        pmcid = m.group(1)
-                        break
-
-            if not pmcid:
-                # can't identify PMCID → skip article
-                continue
-
-            buckets: Dict[str, List[str]] = {k.capitalize(): [] for k in wanted}
-
-            # Walk all <sec> regardless of nesting
-            secs = art.xpath('.//*[local-name()="sec"]')
-            for sec in secs:
-                # Prefer @sec-type if present, else the <title> text
-                sec_type = (sec.get("sec-type") or "").strip().lower()
-                title_txt = " ".join(
-                    t.strip() for t in sec.xpath('.//*[local-name()="title"]/text()') if t and t.strip()
-                ).lower()
-
-                # Capture all paragraph text within the section (including nested)
-                para_text = " ".join(
-                    t.strip() for t in sec.xpath('.//*[local-name()="p"]//text()') if t and t.strip()
-                ).strip()
-                if not para_text:
-                    continue
-
-                # Decide the bucket name
-                chosen: Optional[str] = None
-                if sec_type in wanted:
-                    chosen = sec_type
-                else:
-                    for w in wanted:
-                        if w in title_txt:
-                            chosen = w
-                            break
-
-                if chosen:
-                    buckets[chosen.capitalize()].append(para_text)
-
-            # Materialize only non-empty sections
-            realized = {k: "\n".join(v).strip() for k, v in buckets.items() if v}
-            if realized:
-                out[pmcid] = realized
+                return text[3:] if text.upper().startswith("PMC") else text
 
-        return out
+        # fallback: any article-id text like 'PMC9999999' or '9999999',
+        # then (last resort) any <id> text with PMC pattern
+        for t in [text for _, text in article_ids if text] + other_ids:
+            m = _PMC_ID_RE.search(t)
+            if m:
+                return m.group(1)
+
+        # can't identify PMCID → caller skips the article
+        return None
+
+
+# ----------------------------- shared instance -----------------------------
+
+# The app-wide client, bound to the event loop whose connections it pools; main's lifespan
+# closes it, and a short-lived loop (TestClient without a context manager) closes its own.
+_shared: LoopBound[NCBIClient] = LoopBound(
+    lambda: NCBIClient(api_key=settings.ncbi_api_key, email=settings.ncbi_email, tool=settings.ncbi_tool)
+)
+
+
+def get_client() -> NCBIClient:
+    """
+    Shared NCBIClient for the running event loop. Built lazily; a call from a different loop
+    gets a new client instead of one whose connections are bound to another loop.
+    """
+    return _shared.get()
+
+
+async def aclose_client():
+    """Close the shared client; the next get_client() builds a new one."""
+    await _shared.aclose()
@@ -1,11 +1,20 @@
 # app/obs.py
 from __future__ import annotations
-import time, uuid
+import sys, time, uuid
 from typing import Callable
+import orjson
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from app.metrics import metrics
 
+def route_template(request: Request) -> str:
+    """
+    Templated route path (e.g. '/pubmed/article/{pmid}') for metric keys, so label
+    cardinality stays bounded by the number of routes rather than unique URLs.
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
 class RequestObservability(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next: Callable):
         req_id = request.headers.get("x-request-id") or str(uuid.uuid4())
@@ -18,6 +27,16 @@ class RequestObservability(BaseHTTPMiddleware):
             path = request.url.path
             method = request.method
             metrics.inc(f"http.requests.total")
-            metrics.observe_ms(f"http.latency.{method}.{path}", ms)
+            metrics.observe_ms(f"http.latency.{method}.{route_template(request)}", ms)
             # lightweight structured log to stdout (shows up in Uvicorn logs)
-            print(f'{{"req_id":"{req_id}","method":"{method}","path":"{path}","ms":{ms:.1f}}}')
+            line = orjson.dumps(
+                {"req_id": req_id, "method": method, "path": path, "ms": round(ms, 1)},
+                option=orjson.OPT_APPEND_NEWLINE,
+            )
+            # one pre-encoded write, skipping print()'s str formatting and text-layer encode;
+            # a replaced stdout (pytest capture, StringIO) may have no binary buffer
+            out = getattr(sys.stdout, "buffer", None)
+            if out is not None:
+                out.write(line)
+            else:
+                sys.stdout.write(line.decode())
@@ -0,0 +1,64 @@
+# app/pool.py
+from __future__ import annotations
+import asyncio
+from typing import AsyncIterator, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+async def _close_on_exit(obj) -> AsyncIterator[None]:
+    try:
+        yield
+    finally:
+        await obj.aclose()
+
+
+class LoopBound(Generic[T]):
+    """
+    Lazily built, process-wide async resource with an `aclose()` (a pooled HTTP client),
+    tied to the event loop that built it: pooled connections can only be used and closed there.
+    - get() from another loop retires the old instance and builds a new one.
+    - Each instance is closed on its own loop before that loop goes away: a small async
+      generator guards it, and loop.shutdown_asyncgens() (run by asyncio.run / Runner, so also
+      by TestClient's portal) finalizes the guard while the loop still runs. Short-lived loops
+      therefore don't leak the pool's sockets.
+    """
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._obj: Optional[T] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._guard = None  # _close_on_exit(self._obj), registered with self._loop
+
+    def get(self) -> T:
+        loop = asyncio.get_running_loop()
+        if self._obj is None or self._loop is not loop:
+            self._retire()
+            obj = self._factory()
+            guard = _close_on_exit(obj)
+            # Step the guard to its yield synchronously: the first step registers it with the
+            # running loop's asyncgen hooks and contains no await, so it completes right here.
+            try:
+                guard.__anext__().send(None)
+            except StopIteration:
+                pass
+            self._obj, self._loop, self._guard = obj, loop, guard
+        return self._obj
+
+    def _retire(self):
+        obj, loop = self._obj, self._loop
+        self._obj, self._loop, self._guard = None, None, None
+        if obj is None or loop.is_closed():
+            # a closed loop already ran the guard at shutdown (or can no longer run anything)
+            return
+        if loop.is_running():
+            # still serving another thread: close the instance over there
+            asyncio.run_coroutine_threadsafe(obj.aclose(), loop)
+
+    async def aclose(self):
+        """Close the current instance (if built on this loop); the next get() builds a new one."""
+        guard, loop = self._guard, self._loop
+        if guard is not None and loop is asyncio.get_running_loop():
+            self._obj, self._loop, self._guard = None, None, None
+            await guard.aclose()  # runs the guard's finally: obj.aclose()
+        else:
+            self._retire()
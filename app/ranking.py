@@ -1,69 +1,116 @@
 from __future__ import annotations
-from typing import List, Dict, Tuple
-import math
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
 import numpy as np
 from app.textproc import tokenize_lower
 
-def bm25_scores(query: str, docs: List[str], k1: float = 1.2, b: float = 0.75) -> List[float]:
+@lru_cache(maxsize=8192)
+def _query_tokens(query: str) -> Tuple[str, ...]:
+    # queries repeat across requests; a tuple keeps the cached value immutable
+    return tuple(tokenize_lower(query))
+
+def bm25_scores(
+    query: str,
+    docs: List[str],
+    k1: float = 1.2,
+    b: float = 0.75,
+    doc_tokens: Optional[Sequence[Sequence[str]]] = None,
+) -> List[float]:
     """
     Minimal BM25 over whitespace/word tokens.
+    Only query terms can score, so term frequencies are gathered into an N x |Q| matrix
+    and the BM25 formula is evaluated as one vectorized NumPy expression.
+    Pass `doc_tokens` (tokenize_lower of each doc) to skip re-tokenizing the corpus.
     """
     # tokenize
-    q_tokens = tokenize_lower(query)
-    D_tokens = [tokenize_lower(d) for d in docs]
+    q_tokens = _query_tokens(query)
+    D_tokens = doc_tokens if doc_tokens is not None else [tokenize_lower(d) for d in docs]
     N = len(D_tokens)
     if N == 0:
         return []
-    dl = [len(dt) for dt in D_tokens]
-    avgdl = sum(dl) / max(N, 1)
-
-    # document frequencies
-    df: Dict[str, int] = {}
-    for dt in D_tokens:
-        for t in set(dt):
-            df[t] = df.get(t, 0) + 1
-
-    def idf(t: str) -> float:
-        # bm25+style idf with +1 to avoid zero/negatives
-        n = df.get(t, 0)
-        return math.log((N - n + 0.5) / (n + 0.5) + 1.0)
-
-    # term frequencies per doc
-    scores = [0.0] * N
+    if not q_tokens:
+        return [0.0] * N
+
+    # query term -> column; repeated query terms weigh once per occurrence
+    q_terms = list(dict.fromkeys(q_tokens))
+    q_weight = np.array([q_tokens.count(t) for t in q_terms], dtype=np.float64)
+
+    tf = np.zeros((N, len(q_terms)), dtype=np.float64)
     for i, dt in enumerate(D_tokens):
-        tf: Dict[str, int] = {}
-        for t in dt:
-            tf[t] = tf.get(t, 0) + 1
-        denom = k1 * (1 - b + b * (dl[i] / max(avgdl, 1e-9)))
-        s = 0.0
-        for t in q_tokens:
-            if t not in tf:
-                continue
-            s += idf(t) * (tf[t] * (k1 + 1)) / (tf[t] + denom)
-        scores[i] = s
-    return scores
+        counts = Counter(dt)
+        tf[i] = [counts.get(t, 0) for t in q_terms]
+    dl = np.fromiter((len(dt) for dt in D_tokens), dtype=np.float64, count=N)
+    avgdl = dl.mean()
+
+    # bm25+style idf with +1 to avoid zero/negatives
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log((N - df + 0.5) / (df + 0.5) + 1.0)
+
+    denom = k1 * (1 - b + b * (dl / max(avgdl, 1e-9)))
+    sat = np.divide(tf * (k1 + 1), tf + denom[:, None], out=np.zeros_like(tf), where=tf > 0)
+    return (sat @ (idf * q_weight)).tolist()
+
+def _minmax_np(x) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float64)
+    if x.size == 0:
+        return x
+    lo, hi = x.min(), x.max()
+    if hi - lo < 1e-12:
+        return np.zeros_like(x)
+    return (x - lo) / (hi - lo)
 
 def minmax(x: List[float]) -> List[float]:
     if not x:
         return x
-    lo, hi = min(x), max(x)
-    if hi - lo < 1e-12:
-        return [0.0 for _ in x]
-    return [(v - lo) / (hi - lo) for v in x]
+    return _minmax_np(x).tolist()
 
-def hybrid_scores(query: str, docs: List[str], cos_scores: List[float] | None, alpha: float = 0.5) -> List[float]:
+def hybrid_scores(
+    query: str,
+    docs: List[str],
+    cos_scores: List[float] | np.ndarray | None,
+    alpha: float = 0.5,
+    doc_tokens: Optional[Sequence[Sequence[str]]] = None,
+) -> List[float]:
     """
     Combine BM25 (lexical) and cosine (semantic) via min-max normalized convex combo.
     alpha: weight on cosine (0..1). 0.5 is a good default.
     """
-    bm = bm25_scores(query, docs)
-    bm_n = minmax(bm)
+    bm_n = _minmax_np(bm25_scores(query, docs, doc_tokens=doc_tokens))
     if cos_scores is None:
-        return bm_n
-    cos_n = minmax(cos_scores)
-    return [alpha * cs + (1 - alpha) * bs for cs, bs in zip(cos_n, bm_n)]
+        return bm_n.tolist()
+    cos_n = _minmax_np(cos_scores)
+    return (alpha * cos_n + (1 - alpha) * bm_n).tolist()
+
+def top_k_indices(scores: List[float] | np.ndarray, k: int) -> List[int]:
+    """
+    Indices of the k highest scores, best first, via an O(N) partition instead of a full sort.
+    Equal scores keep index order.
+    """
+    s = np.asarray(scores, dtype=np.float64)
+    k = min(k, s.size)
+    if k <= 0:
+        return []
+    kth = s[np.argpartition(-s, k - 1)[k - 1]]  # k-th highest score
+    # everything above the cut, then the lowest-index ties at it (both already in index order)
+    above = np.flatnonzero(s > kth)
+    ties = np.flatnonzero(s == kth)[: k - above.size]
+    idx = np.concatenate((above, ties))
+    return idx[np.argsort(-s[idx], kind="stable")].tolist()
 
 import datetime
+import time
+
+# (wall-clock time of last refresh, UTC year); the year only needs re-deriving once a minute
+_YEAR_CACHE: Tuple[float, int] = (0.0, 0)
+
+def current_year() -> int:
+    """Current UTC year, recomputed at most once per minute."""
+    global _YEAR_CACHE
+    t = time.time()
+    if t - _YEAR_CACHE[0] > 60:
+        _YEAR_CACHE = (t, datetime.datetime.now(datetime.timezone.utc).year)
+    return _YEAR_CACHE[1]
 
 def freshness_score(year: int | None, now_year: int | None = None, half_life_years: float = 5.0) -> float:
     """
@@ -72,17 +119,60 @@ def freshness_score(year: int | None, now_year: int | None = None, half_life_yea
     if year is None:
         return 0.5  # neutral if unknown
     if now_year is None:
-        now_year = datetime.datetime.utcnow().year
+        now_year = current_year()
     age = max(0.0, float(now_year - year))
     # exp2(-age/half_life): 1 at age=0, 0.5 at half_life, etc.
     return 2.0 ** (-age / max(half_life_years, 0.1))
 
-def blend_with_freshness(content_scores: List[float], fresh_scores: List[float], freshness_weight: float = 0.3) -> List[float]:
+def freshness_scores_np(years: np.ndarray, now_year: int, half_life_years: float = 5.0) -> np.ndarray:
+    """
+    Vectorized freshness_score over an array of years; NaN marks an unknown year (scored 0.5).
+    """
+    years = np.asarray(years, dtype=np.float64)
+    age = np.maximum(float(now_year) - years, 0.0)
+    fresh = np.exp2(-age / max(half_life_years, 0.1))
+    return np.where(np.isnan(years), 0.5, fresh)
+
+def blend_with_freshness_np(content_scores, fresh_scores, freshness_weight: float = 0.3) -> np.ndarray:
+    """
+    Array form of blend_with_freshness, for callers that keep post-processing the scores in NumPy.
+    """
+    c = _minmax_np(content_scores)
+    f = _minmax_np(fresh_scores)
+    fw = float(np.clip(freshness_weight, 0.0, 1.0))
+    return (1.0 - fw) * c + fw * f
+
+def blend_with_freshness(content_scores: List[float], fresh_scores: List[float] | np.ndarray, freshness_weight: float = 0.3) -> List[float]:
     """
     Combine content relevance (BM25/Embeddings hybrid) with freshness via convex combo.
     """
-    from .ranking import minmax  # re-use normalization
-    c = minmax(content_scores)
-    f = minmax(fresh_scores)
-    fw = max(0.0, min(1.0, freshness_weight))
-    return [ (1.0 - fw) * ci + fw * fi for ci, fi in zip(c, f) ]
+    return blend_with_freshness_np(content_scores, fresh_scores, freshness_weight).tolist()
+
+def score_groups(
+    scores,
+    years: Sequence[Optional[int]],
+    boosts: Sequence[float],
+    counts: Sequence[int],
+    now_year: int,
+    half_life_years: float = 5.0,
+    freshness_weight: float = 0.3,
+) -> List[float]:
+    """
+    Final per-chunk scores: content scores blended with freshness, times a multiplicative boost.
+    Year and boost are given once per group of consecutive chunks (a record, or one of its
+    sections) with the group's chunk count, and expanded with np.repeat, so freshness and
+    boosts are evaluated per group rather than per chunk. Unknown years (None) score 0.5.
+    """
+    n = np.asarray(counts, dtype=np.intp)
+    fresh = np.repeat(freshness_scores_np(np.array(years, dtype=np.float64), now_year, half_life_years), n)
+    boost = np.repeat(np.asarray(boosts, dtype=np.float64), n)
+    return (blend_with_freshness_np(scores, fresh, freshness_weight) * boost).tolist()
+
+def unique_with_inverse(texts: Sequence[str]) -> Tuple[List[str], np.ndarray]:
+    """
+    Distinct texts in first-seen order, plus `inverse` with texts[i] == uniq[inverse[i]],
+    so per-text work (embedding, similarity) runs once per distinct text: x_uniq[inverse].
+    """
+    pos: Dict[str, int] = {}
+    inverse = np.fromiter((pos.setdefault(t, len(pos)) for t in texts), dtype=np.intp, count=len(texts))
+    return list(pos), inverse
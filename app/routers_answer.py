@@ -1,21 +1,21 @@
 # app/routers_answer.py
 from __future__ import annotations
 
-import datetime
+import asyncio
 from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 
-from app.config import settings
-from app.ncbi import NCBIClient
-from app.textproc import chunk_by_chars
-from app.embedding import embed_texts, cosine_matrix
-from app.ranking import hybrid_scores, freshness_score, blend_with_freshness
-from app.evidence import classify_study_type, preference_boost, section_boost
+from app.ncbi import get_client
+from app.textproc import chunk_by_chars, tokenize_lower
+from app.embedding import cosine_to_query, embed_cached, embed_query
+from app.ranking import current_year, hybrid_scores, score_groups, top_k_indices, unique_with_inverse
+from app.evidence import classify_study_type, preference_boost, normalize_prefs, section_boost
 from app.synthesis import build_messages, call_openai_json, unique_references
 
-router = APIRouter(tags=["answer"])
+router = APIRouter(tags=["answer"], default_response_class=ORJSONResponse)
 
 
 class AnswerRequest(BaseModel):
@@ -77,11 +77,7 @@ async def grounded_answer_get():
 @router.post("/answer")
 async def grounded_answer(req: AnswerRequest):
     # 1) Retrieval primitives
-    client = NCBIClient(
-        api_key=settings.ncbi_api_key,
-        email=settings.ncbi_email,
-        tool=settings.ncbi_tool,
-    )
+    client = get_client()
     pmids = await client.esearch(term=req.term, retmax=req.retmax, sort="relevance")
     if not pmids:
         return {
@@ -92,62 +88,84 @@ async def grounded_answer(req: AnswerRequest):
             "references": [],
         }
 
-    meta = await client.esummary(pmids)
-    xml = await client.efetch_pubmed_xml(pmids)
-    abstracts = client.parse_pubmed_abstracts(xml)
-    records = client.assemble_records(pmids, meta, abstracts)
-
-    # 2) Build chunk corpus (Abstracts + optional PMC sections)
-    now_year = datetime.datetime.utcnow().year
-    prefs = [t.strip() for t in (req.prefer_types.split(",") if req.prefer_types else []) if t.strip()]
-    wanted_secs = [s.strip().capitalize() for s in req.include_sections.split(",") if s.strip()]
-
-    corpus: List[str] = []
-    chunk_meta: List[Dict[str, Any]] = []
-
-    # 2a) Abstract chunks
-    for r in records:
-        if not r["abstract"]:
-            continue
-        stype = classify_study_type(r.get("pubtypes") or [], r.get("title", ""))
-        parts = chunk_by_chars(r["abstract"], max_chars=req.chunk_chars, overlap=req.overlap)
-        for idx, p in enumerate(parts):
-            corpus.append(p["text"])
-            chunk_meta.append(
-                {
-                    "source": "pubmed",
-                    "pmid": r["pmid"],
-                    "pmcid": None,
-                    "section": "Abstract",
-                    "title": r["title"],
-                    "journal": r["journal"],
-                    "pubdate": r["pubdate"],
-                    "year": r.get("year"),
-                    "pubtypes": r.get("pubtypes") or [],
-                    "study_type": stype,
-                    "doi": r["doi"],
-                    "chunk_id": f"{r['pmid']}-abs-{idx}",
-                    "text": p["text"],  # kept for prompt assembly
-                }
-            )
-
-    # 2b) PMC full text sections (optional)
-    if req.want_fulltext:
-        pmc_map = await client.elink_pmc(pmids)  # PMID -> PMCID (numeric string, no 'PMC' prefix)
+    # The query embedding only needs the term: start it now so its round trip overlaps
+    # retrieval, parsing and chunking instead of following them.
+    q_task = asyncio.create_task(embed_query(req.term)) if req.use_embeddings else None
+    try:
+        # ESummary, EFetch (abstracts parsed as they stream in) and optionally ELink run concurrently,
+        # sharing the /select and /retrieve cache entries. pmc_map: PMID -> PMCID (numeric, no 'PMC')
+        records, pmc_map = await client.fetch_pubmed_bundle(pmids, with_pmc=req.want_fulltext)
+
+        # Start the PMC full-text download while abstracts are chunked
         pmcids = list({v for v in pmc_map.values()})
-        if pmcids:
-            pmc_xml = await client.efetch_pmc_xml(pmcids)
-            pmc_sec_map = client.parse_pmc_sections(pmc_xml)  # { pmcid -> {SectionName -> text} }
+        pmc_xml_task = asyncio.create_task(client.efetch_pmc_xml(pmcids)) if pmcids else None
+
+        # 2) Build chunk corpus (Abstracts + optional PMC sections)
+        now_year = current_year()
+        prefs = [t.strip() for t in (req.prefer_types.split(",") if req.prefer_types else []) if t.strip()]
+        wanted_secs = [s.strip().capitalize() for s in req.include_sections.split(",") if s.strip()]
+
+        pref_set = normalize_prefs(prefs)
+        # study type depends only on the record; classify each PMID once for abstracts and PMC sections
+        stype_by_pmid = {
+            r["pmid"]: classify_study_type(r.get("pubtypes") or [], r.get("title", "")) for r in records
+        }
+
+        corpus: List[str] = []
+        chunk_meta: List[Dict[str, Any]] = []
+        # year and study-type/section boost per record section, with its chunk count (see score_groups)
+        grp_years: List[Optional[int]] = []
+        grp_boosts: List[float] = []
+        grp_nchunks: List[int] = []
+
+        # 2a) Abstract chunks
+        for r in records:
+            if not r["abstract"]:
+                continue
+            stype = stype_by_pmid[r["pmid"]]
+            parts = chunk_by_chars(r["abstract"], max_chars=req.chunk_chars, overlap=req.overlap)
+            grp_years.append(r.get("year"))
+            grp_boosts.append(preference_boost(stype, pref_set) * section_boost("Abstract"))
+            grp_nchunks.append(len(parts))
+            for idx, p in enumerate(parts):
+                corpus.append(p["text"])
+                chunk_meta.append(
+                    {
+                        "source": "pubmed",
+                        "pmid": r["pmid"],
+                        "pmcid": None,
+                        "section": "Abstract",
+                        "title": r["title"],
+                        "journal": r["journal"],
+                        "pubdate": r["pubdate"],
+                        "year": r.get("year"),
+                        "pubtypes": r.get("pubtypes") or [],
+                        "study_type": stype,
+                        "doi": r["doi"],
+                        "chunk_id": f"{r['pmid']}-abs-{idx}",
+                    }
+                )
+
+        # 2b) PMC full text sections (optional)
+        records_by_pmid = {r["pmid"]: r for r in records}
+        if pmc_xml_task is not None:
+            pmc_xml = await pmc_xml_task
+            # { pmcid -> {SectionName -> text} }; lxml parsing runs in a worker thread
+            pmc_sec_map = await asyncio.to_thread(client.parse_pmc_sections, pmc_xml)
             for pmid, pmcid in pmc_map.items():
                 sec_dict = pmc_sec_map.get(pmcid, {})
                 if not sec_dict:
                     continue
-                rmeta = next((r for r in records if r["pmid"] == pmid), None)
-                stype = classify_study_type(rmeta.get("pubtypes") or [], rmeta.get("title", "")) if rmeta else "Unspecified"
+                rmeta = records_by_pmid.get(pmid) or {}
+                stype = stype_by_pmid.get(pmid, "Unspecified")
+                type_boost = preference_boost(stype, pref_set)
                 for sec_name, sec_text in sec_dict.items():
                     if sec_name not in wanted_secs:
                         continue
                     parts = chunk_by_chars(sec_text, max_chars=req.chunk_chars, overlap=req.overlap)
+                    grp_years.append(rmeta.get("year"))
+                    grp_boosts.append(type_boost * section_boost(sec_name))
+                    grp_nchunks.append(len(parts))
                     for idx, p in enumerate(parts):
                         corpus.append(p["text"])
                         chunk_meta.append(
@@ -156,67 +174,75 @@ async def grounded_answer(req: AnswerRequest):
                                 "pmid": pmid,
                                 "pmcid": pmcid,  # numeric (no 'PMC' prefix)
                                 "section": sec_name,
-                                "title": (rmeta or {}).get("title", ""),
-                                "journal": (rmeta or {}).get("journal", ""),
-                                "pubdate": (rmeta or {}).get("pubdate", ""),
-                                "year": (rmeta or {}).get("year"),
-                                "pubtypes": (rmeta or {}).get("pubtypes") or [],
+                                "title": rmeta.get("title", ""),
+                                "journal": rmeta.get("journal", ""),
+                                "pubdate": rmeta.get("pubdate", ""),
+                                "year": rmeta.get("year"),
+                                "pubtypes": rmeta.get("pubtypes") or [],
                                 "study_type": stype,
-                                "doi": (rmeta or {}).get("doi", ""),
+                                "doi": rmeta.get("doi", ""),
                                 "chunk_id": f"{pmcid}-{sec_name}-{idx}",
-                                "text": p["text"],
                             }
                         )
 
-    if not corpus:
+        if not corpus:
+            return {
+                "used_embeddings": False,
+                "answer": "insufficient_evidence",
+                "citations": [],
+                "notes": "No abstracts or full-text sections found for grounding.",
+                "references": [],
+            }
+
+        # 3) Ranking — hybrid lexical+semantic → freshness blend → study-type + section boosts
+        cos_scores = None
+        used_embeddings = False
+        if q_task is not None:
+            # embed each distinct chunk text once (abstract boilerplate / repeated PMC text), then scatter back
+            uniq, inverse = unique_with_inverse(corpus)
+            q_vec, embs = await asyncio.gather(q_task, embed_cached(uniq))
+            if q_vec is not None and embs is not None:
+                cos = await asyncio.to_thread(cosine_to_query, q_vec, embs)
+                cos_scores = cos[inverse].tolist()
+                used_embeddings = True
+
+        def lexical_hybrid() -> List[float]:
+            corpus_tokens = [tokenize_lower(t) for t in corpus]  # tokenize each chunk exactly once
+            return hybrid_scores(req.term, corpus, cos_scores, alpha=req.alpha, doc_tokens=corpus_tokens)
+
+        # tokenization + BM25 are CPU-bound; keep them off the event loop
+        scores = await asyncio.to_thread(lexical_hybrid)
+
+        # freshness blend and study-type/section boosts, evaluated per record section
+        scores = score_groups(
+            scores, grp_years, grp_boosts, grp_nchunks, now_year, req.half_life_years, req.freshness_weight
+        )
+
+        # partial selection (argpartition) instead of sorting the whole corpus; ties keep corpus order
+        top_idxs = top_k_indices(scores, max(1, min(req.top_k, len(corpus))))
+
+        top_chunks: List[Dict[str, Any]] = []
+        for i in top_idxs:
+            meta_i = dict(chunk_meta[i])
+            meta_i["text"] = corpus[i]  # include the actual snippet for prompting
+            top_chunks.append(meta_i)
+
+        # 4) Synthesis (retrieve-or-refuse; JSON-mode contract)
+        messages = build_messages(req.question, top_chunks)
+        model_obj = await call_openai_json(messages)
+
+        # 5) References bundle for UI (PubMed + PMC links)
+        references = unique_references(top_chunks)
+
+        # 6) Contracted response
         return {
-            "used_embeddings": False,
-            "answer": "insufficient_evidence",
-            "citations": [],
-            "notes": "No abstracts or full-text sections found for grounding.",
-            "references": [],
+            "used_embeddings": used_embeddings,
+            "answer": model_obj.get("answer", "insufficient_evidence"),
+            "citations": model_obj.get("citations", []),
+            "notes": model_obj.get("notes", ""),
+            "references": references,
         }
-
-    # 3) Ranking — hybrid lexical+semantic → freshness blend → study-type + section boosts
-    cos_scores = None
-    used_embeddings = False
-    if req.use_embeddings:
-        embs = await embed_texts([req.term] + corpus)
-        if embs is not None:
-            cos_scores = cosine_matrix(embs[0:1], embs[1:])[0].tolist()
-            used_embeddings = True
-
-    scores = hybrid_scores(req.term, corpus, cos_scores, alpha=req.alpha)
-
-    fresh = [freshness_score(meta_i.get("year"), now_year, req.half_life_years) for meta_i in chunk_meta]
-    scores = blend_with_freshness(scores, fresh, req.freshness_weight)
-
-    scores = [
-        sc * preference_boost(chunk_meta[i]["study_type"], prefs) * section_boost(chunk_meta[i]["section"])
-        for i, sc in enumerate(scores)
-    ]
-
-    order = sorted(range(len(corpus)), key=lambda i: scores[i], reverse=True)
-    top_idxs = order[: max(1, min(req.top_k, len(order)))]
-
-    top_chunks: List[Dict[str, Any]] = []
-    for i in top_idxs:
-        meta_i = dict(chunk_meta[i])
-        meta_i["text"] = corpus[i]  # include the actual snippet for prompting
-        top_chunks.append(meta_i)
-
-    # 4) Synthesis (retrieve-or-refuse; JSON-mode contract)
-    messages = build_messages(req.question, top_chunks)
-    model_obj = await call_openai_json(messages)
-
-    # 5) References bundle for UI (PubMed + PMC links)
-    references = unique_references(top_chunks)
-
-    # 6) Contracted response
-    return {
-        "used_embeddings": used_embeddings,
-        "answer": model_obj.get("answer", "insufficient_evidence"),
-        "citations": model_obj.get("citations", []),
-        "notes": model_obj.get("notes", ""),
-        "references": references,
-    }
+    finally:
+        # early returns / errors leave the query embedding unawaited: don't orphan it
+        if q_task is not None and not q_task.done():
+            q_task.cancel()
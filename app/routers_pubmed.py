@@ -1,27 +1,19 @@
 # app/routers_pubmed.py
 from __future__ import annotations
 
+import asyncio
 from typing import Any, Dict, List, Optional
-import datetime
 
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 
-from app.config import settings
-from app.ncbi import NCBIClient
-from app.textproc import chunk_by_chars
-from app.embedding import embed_texts, cosine_matrix
-from app.ranking import hybrid_scores, blend_with_freshness, freshness_score
-from app.evidence import classify_study_type, preference_boost
+from app.ncbi import get_client
+from app.textproc import chunk_by_chars, tokenize_lower
+from app.embedding import cosine_to_query, embed_cached, embed_query
+from app.ranking import current_year, hybrid_scores, score_groups, top_k_indices, unique_with_inverse
+from app.evidence import classify_study_type, preference_boost, normalize_prefs
 
-router = APIRouter(tags=["pubmed"])
-
-
-def _client() -> NCBIClient:
-    return NCBIClient(
-        api_key=settings.ncbi_api_key,
-        email=settings.ncbi_email,
-        tool=settings.ncbi_tool,
-    )
+router = APIRouter(tags=["pubmed"], default_response_class=ORJSONResponse)
 
 
 @router.get("/search")
@@ -29,7 +21,7 @@ async def pubmed_search(
     term: str = Query(..., description="PubMed query (you can use [tiab] tags)"),
     retmax: int = Query(20, ge=1, le=100),
 ):
-    client = _client()
+    client = get_client()
     pmids = await client.esearch(term=term, retmax=retmax, sort="relevance")
     return {"count": len(pmids), "pmids": pmids}
 
@@ -39,15 +31,13 @@ async def pubmed_retrieve(
     term: str = Query(..., description="PubMed query (e.g., cancer[tiab])"),
     retmax: int = Query(10, ge=1, le=50),
 ):
-    client = _client()
+    client = get_client()
     pmids = await client.esearch(term=term, retmax=retmax, sort="relevance")
     if not pmids:
         return {"records": []}
 
-    meta = await client.esummary(pmids)
-    xml = await client.efetch_pubmed_xml(pmids)
-    abstracts = client.parse_pubmed_abstracts(xml)
-    records = client.assemble_records(pmids, meta, abstracts)
+    # ESummary + EFetch run concurrently
+    records, _ = await client.fetch_pubmed_bundle(pmids, with_pmc=False)
 
     if all(not r["abstract"] for r in records):
         raise HTTPException(status_code=424, detail="No abstracts available for grounding.")
@@ -66,12 +56,12 @@ async def pubmed_select(
     use_embeddings: bool = True,
     freshness_weight: float = 0.3,      # 0..1 blend weight for recency
     half_life_years: float = 5.0,       # recency half-life in years
-    prefer_types: Optional[str] = None  # e.g., "RCT,Meta-analysis"
+    prefer_types: Optional[str] = None, # e.g., "RCT,Meta-analysis"
 ):
     """
     End-to-end retrieval: search → fetch PubMed + PMC → chunk → rank → (freshness + study-type) → top-K evidence chunks.
     """
-    client = _client()
+    client = get_client()
     pmids = await client.esearch(term=term, retmax=min(retmax, 100), sort="relevance")
     if not pmids:
         return {
@@ -84,90 +74,112 @@ async def pubmed_select(
             "chunks": [],
         }
 
-    # --- Pull PubMed metadata + abstracts ---
-    meta = await client.esummary(pmids)
-    xml = await client.efetch_pubmed_xml(pmids)
-    abstracts = client.parse_pubmed_abstracts(xml)
-    records = client.assemble_records(pmids, meta, abstracts)
-
-    now_year = datetime.datetime.utcnow().year
-    prefs = [t.strip() for t in (prefer_types.split(",") if prefer_types else []) if t.strip()]
-
-    corpus: List[str] = []
-    chunk_meta: List[Dict[str, Any]] = []
-
-    # --- Process PubMed abstracts ---
-    for r in records:
-        if not r["abstract"]:
-            continue
-        stype = classify_study_type(r.get("pubtypes") or [], r.get("title", ""))
-        parts = chunk_by_chars(r["abstract"], max_chars=chunk_chars, overlap=overlap)
-        for idx, p in enumerate(parts):
-            corpus.append(p["text"])
-            chunk_meta.append({
-                "pmid": r["pmid"],
-                "pmcid": "",  # no PMC from PubMed record
-                "title": r["title"],
-                "journal": r["journal"],
-                "pubdate": r["pubdate"],
-                "year": r.get("year"),
-                "pubtypes": r.get("pubtypes") or [],
-                "study_type": stype,
-                "doi": r["doi"],
-                "chunk_id": f"{r['pmid']}-{idx}",
-                "section": None,
-                "text": p["text"],
-            })
-
-    # --- Try PMC retrieval for full text sections ---
-    # PMC IDs can be retrieved from PubMed meta via article IDs (not implemented here)
-    # This block can be extended to call efetch_pmc_sections and merge.
-    # For now, the structure is ready to merge PMC chunks when available.
-
-    if not corpus:
+    # The query embedding only needs the term: start it now so its round trip overlaps
+    # the ESummary/EFetch fetch and chunking below instead of following them.
+    q_task = asyncio.create_task(embed_query(term)) if use_embeddings else None
+    try:
+        # --- Pull PubMed metadata + abstracts (ESummary + EFetch concurrently) ---
+        records, _ = await client.fetch_pubmed_bundle(pmids, with_pmc=False)
+
+        now_year = current_year()
+        prefs = [t.strip() for t in (prefer_types.split(",") if prefer_types else []) if t.strip()]
+
+        pref_set = normalize_prefs(prefs)
+
+        # --- Process PubMed abstracts ---
+        # Chunk every record first so the corpus size is known, then fill preallocated lists
+        per_record = [
+            (r, chunk_by_chars(r["abstract"], max_chars=chunk_chars, overlap=overlap))
+            for r in records
+            if r["abstract"]
+        ]
+        total = sum(len(parts) for _, parts in per_record)
+        corpus: List[Optional[str]] = [None] * total
+        chunk_meta: List[Optional[Dict[str, Any]]] = [None] * total
+        # year and study-type boost per record, with its chunk count (see score_groups)
+        rec_years: List[Optional[int]] = []
+        rec_boosts: List[float] = []
+        rec_nchunks: List[int] = []
+
+        i = 0
+        for r, parts in per_record:
+            stype = classify_study_type(r.get("pubtypes") or [], r.get("title", ""))
+            rec_years.append(r.get("year"))
+            rec_boosts.append(preference_boost(stype, pref_set))
+            rec_nchunks.append(len(parts))
+            for idx, p in enumerate(parts):
+                corpus[i] = p["text"]
+                chunk_meta[i] = {
+                    "pmid": r["pmid"],
+                    "pmcid": "",  # no PMC from PubMed record
+                    "title": r["title"],
+                    "journal": r["journal"],
+                    "pubdate": r["pubdate"],
+                    "year": r.get("year"),
+                    "pubtypes": r.get("pubtypes") or [],
+                    "study_type": stype,
+                    "doi": r["doi"],
+                    "chunk_id": f"{r['pmid']}-{idx}",
+                    "section": None,
+                }
+                i += 1
+
+        # --- Try PMC retrieval for full text sections ---
+        # PMC IDs can be retrieved from PubMed meta via article IDs (not implemented here)
+        # This block can be extended to call efetch_pmc_sections and merge.
+        # For now, the structure is ready to merge PMC chunks when available.
+
+        if not corpus:
+            return {
+                "query": term,
+                "top_k": 0,
+                "used_embeddings": False,
+                "freshness_weight": freshness_weight,
+                "half_life_years": half_life_years,
+                "prefer_types": prefs,
+                "chunks": [],
+            }
+
+        # --- Ranking ---
+        cos_scores = None
+        used_embeddings = False
+        if q_task is not None:
+            # embed each distinct chunk text once (shared boilerplate across abstracts), then scatter back
+            uniq, inverse = unique_with_inverse(corpus)
+            # query and chunk vectors come from caches; misses share one coalesced embeddings call
+            q_vec, embs = await asyncio.gather(q_task, embed_cached(uniq))
+            if q_vec is not None and embs is not None:
+                # rows are L2-normalized by embed_texts, so cosine is one (U, D) @ (D,) product
+                cos_scores = cosine_to_query(q_vec, embs)[inverse]
+                used_embeddings = True
+
+        corpus_tokens = [tokenize_lower(t) for t in corpus]  # tokenize each chunk exactly once
+        scores = hybrid_scores(term, corpus, cos_scores, alpha=alpha, doc_tokens=corpus_tokens)
+
+        # freshness blend and study-type boost, evaluated per record; plain floats for the response
+        scores = score_groups(
+            scores, rec_years, rec_boosts, rec_nchunks, now_year, half_life_years, freshness_weight
+        )
+
+        top_idxs = top_k_indices(scores, max(1, min(top_k, len(scores))))
+
+        out = []
+        for i in top_idxs:
+            o = dict(chunk_meta[i])
+            o["text"] = corpus[i]  # snippet lives only in corpus; attach it for the top-K
+            o["score"] = scores[i]
+            out.append(o)
+
         return {
             "query": term,
-            "top_k": 0,
-            "used_embeddings": False,
+            "top_k": len(out),
+            "used_embeddings": used_embeddings,
             "freshness_weight": freshness_weight,
             "half_life_years": half_life_years,
             "prefer_types": prefs,
-            "chunks": [],
+            "chunks": out,
         }
-
-    # --- Ranking ---
-    cos_scores = None
-    used_embeddings = False
-    if use_embeddings:
-        embs = await embed_texts([term] + corpus)
-        if embs is not None:
-            qv = embs[0:1]        # (1, D)
-            dv = embs[1:]         # (N, D)
-            cos_scores = cosine_matrix(qv, dv)[0].tolist()
-            used_embeddings = True
-
-    scores = hybrid_scores(term, corpus, cos_scores, alpha=alpha)
-
-    fresh = [freshness_score(meta.get("year"), now_year, half_life_years) for meta in chunk_meta]
-    scores = blend_with_freshness(scores, fresh, freshness_weight)
-
-    scores = [sc * preference_boost(chunk_meta[i]["study_type"], prefs) for i, sc in enumerate(scores)]
-
-    order = sorted(range(len(corpus)), key=lambda i: scores[i], reverse=True)
-    top_idxs = order[: max(1, min(top_k, len(order)))]
-
-    out = []
-    for i in top_idxs:
-        o = dict(chunk_meta[i])
-        o["score"] = scores[i]
-        out.append(o)
-
-    return {
-        "query": term,
-        "top_k": len(out),
-        "used_embeddings": used_embeddings,
-        "freshness_weight": freshness_weight,
-        "half_life_years": half_life_years,
-        "prefer_types": prefs,
-        "chunks": out,
-    }
+    finally:
+        # early returns / errors leave the query embedding unawaited: don't orphan it
+        if q_task is not None and not q_task.done():
+            q_task.cancel()
@@ -1,10 +1,10 @@
 # app/synthesis.py
 from __future__ import annotations
 
-import json
 from typing import Any, Dict, List, Optional
 
 import httpx
+import orjson
 
 from app.config import settings
 
@@ -19,29 +19,37 @@ SYSTEM_PROMPT = (
 )
 
 
+# Evidence block templates: tag, title, optional section suffix, then the snippet.
+_CTX_TPL_PMC = "[PMCID:PMC{pmcid}] {title}{sec}\n{snippet}"
+_CTX_TPL_PMID = "[PMID:{pmid}] {title}{sec}\n{snippet}"
+
+
+def _render_context(c: Dict[str, Any]) -> str:
+    section = c.get("section")
+    pmcid = c.get("pmcid")
+    fields = {
+        "title": (c.get("title") or "").strip(),
+        "snippet": (c.get("text") or "").strip(),
+        "sec": f" — Section: {section}" if section else "",
+    }
+    if pmcid:
+        fields["pmcid"] = pmcid
+        return _CTX_TPL_PMC.format_map(fields)
+    fields["pmid"] = c["pmid"]
+    return _CTX_TPL_PMID.format_map(fields)
+
+
 def build_messages(question: str, contexts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Build a grounding-first prompt with compact evidence snippets.
     Each context item may include: pmid (str), pmcid (str, no 'PMC' prefix), title (str),
     text (str snippet), and optional section (e.g., 'Results').
     """
-    ctx_lines: List[str] = []
-    for c in contexts:
-        if c.get("pmcid"):
-            tag = f"[PMCID:PMC{c['pmcid']}]"
-        else:
-            tag = f"[PMID:{c['pmid']}]"
-        title = (c.get("title") or "").strip()
-        snippet = (c.get("text") or "").strip()
-        section = c.get("section")
-        header = f"{tag} {title}" + (f" — Section: {section}" if section else "")
-        ctx_lines.append(f"{header}\n{snippet}")
-
     user_block = (
         "Question:\n"
         f"{question.strip()}\n\n"
         "Evidence (snippets; cite with the PMIDs/PMCIDs shown):\n"
-        + "\n\n".join(ctx_lines)
+        + "\n\n".join(_render_context(c) for c in contexts)
     )
 
     # Strict JSON response rules to keep outputs parseable and auditable.
@@ -88,12 +96,12 @@ async def call_openai_json(messages: List[Dict[str, str]]) -> Dict[str, Any]:
 
     try:
         async with httpx.AsyncClient(timeout=120) as c:
-            r = await c.post(url, headers=headers, json=payload)
+            r = await c.post(url, headers=headers, content=orjson.dumps(payload))
             r.raise_for_status()
-            data = r.json()
+            data = orjson.loads(r.content)
 
         raw = data["choices"][0]["message"]["content"]
-        obj = json.loads(raw)
+        obj = orjson.loads(raw)
 
         # Basic schema guard
         if not isinstance(obj, dict):
@@ -4,13 +4,16 @@ import re
 from typing import List, Dict, Any
 
 # Regex utilities
-_SENT_SPLIT = re.compile(r'(?<=[.!?])\s+')
+# Sentence boundary in whitespace-normalized text: terminal punctuation plus its single space.
+# No lookbehind, so the scanner jumps straight to punctuation instead of testing every space.
+_SENT_BOUNDARY = re.compile(r'[.!?] ')
 _WORD = re.compile(r"\b\w+\b", re.UNICODE)
 
 
 def normalize_whitespace(s: str) -> str:
     """Collapse runs of whitespace and trim ends."""
-    return re.sub(r"\s+", " ", s or "").strip()
+    # str.split() splits on exactly the characters regex \s matches, in C
+    return " ".join((s or "").split())
 
 
 def split_sentences(text: str) -> List[str]:
@@ -22,8 +25,13 @@ def split_sentences(text: str) -> List[str]:
     text = normalize_whitespace(text)
     if not text:
         return []
-    parts = _SENT_SPLIT.split(text)
-    return [p.strip() for p in parts if p.strip()]
+    out: List[str] = []
+    prev = 0
+    for m in _SENT_BOUNDARY.finditer(text):
+        out.append(text[prev:m.start() + 1])
+        prev = m.end()
+    out.append(text[prev:])
+    return out
 
 
 def chunk_by_chars(
@@ -33,55 +41,43 @@ def chunk_by_chars(
 ) -> List[Dict[str, Any]]:
     """
     Build chunks ~max_chars, aligned to sentence boundaries, with soft overlap.
-    Returns list of {text, start_char, end_char}.
+    Returns list of {text, start_char, end_char}; offsets index into the
+    whitespace-normalized text, and each chunk's text is exactly that slice.
     """
     if not text:
         return []
 
-    sents = split_sentences(text)
-    chunks: List[Dict[str, Any]] = []
+    # Fast path: most abstracts fit in one chunk, so skip the sentence scan entirely.
+    norm = normalize_whitespace(text)
+    if len(norm) <= max_chars:
+        return [{"text": norm, "start_char": 0, "end_char": len(norm)}] if norm else []
+
+    # Sentence end offsets; after normalization sentences are separated by exactly one space
+    ends = [m.start() + 1 for m in _SENT_BOUNDARY.finditer(norm)]
+    ends.append(len(norm))
 
-    cur: List[str] = []
-    cur_len = 0
-    start = 0
-    pos = 0
-
-    for s in sents:
-        s_len = len(s) + 1  # account for an intervening space
-        if cur and (cur_len + s_len > max_chars):
-            chunk_text = " ".join(cur).strip()
-            chunks.append(
-                {
-                    "text": chunk_text,
-                    "start_char": start,
-                    "end_char": start + len(chunk_text),
-                }
-            )
-            # Overlap tail to preserve context continuity
-            tail = ""
-            if overlap > 0 and len(chunk_text) > overlap:
-                tail = chunk_text[-overlap:]
-            cur = [tail] if tail else []
-            cur_len = len(tail)
-            start = pos - len(tail)
-
-        cur.append(s)
-        cur_len += s_len
-        pos += s_len
-
-    if cur:
-        chunk_text = " ".join(cur).strip()
-        chunks.append(
-            {
-                "text": chunk_text,
-                "start_char": start,
-                "end_char": start + len(chunk_text),
-            }
-        )
+    chunks: List[Dict[str, Any]] = []
+    start = 0  # offset where the current chunk begins
+    end = 0    # end offset of the last sentence taken into it (== start: nothing taken yet)
+
+    for sent_end in ends:
+        if end > start and sent_end - start > max_chars:
+            chunks.append({"text": norm[start:end], "start_char": start, "end_char": end})
+            # Overlap tail to preserve context continuity, cut on a word boundary when possible
+            next_start = end + 1
+            if overlap > 0 and end - start > overlap:
+                cut = norm.find(" ", end - overlap, end)
+                next_start = cut + 1 if cut != -1 else end - overlap
+            start = next_start
+        end = sent_end  # always take at least one new sentence per chunk
+
+    if end > start:
+        chunks.append({"text": norm[start:end], "start_char": start, "end_char": end})
 
     return chunks
 
 
 def tokenize_lower(s: str) -> List[str]:
     """Lowercased token stream for lexical scoring."""
-    return [m.group(0).lower() for m in _WORD.finditer(s or "")]
+    # lowercase once, then findall: no Match objects and no per-token lower() copies
+    return _WORD.findall((s or "").lower())
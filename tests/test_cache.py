@@ -0,0 +1,77 @@
+# tests/test_cache.py
+import asyncio
+from app.cache import TTLCache
+
+def test_lru_evicts_least_recently_used():
+    c = TTLCache(max_items=2, ttl_seconds=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # touch "a" so "b" becomes the LRU victim
+    c.set("c", 3)
+    assert c.get("a") == 1
+    assert c.get("b") is None
+    assert c.get("c") == 3
+
+def test_expired_entries_are_dropped():
+    c = TTLCache(max_items=4, ttl_seconds=-1)
+    c.set("a", 1)
+    assert c.get("a") is None
+
+def test_tinylfu_rejects_one_hit_wonders():
+    c = TTLCache(max_items=2, ttl_seconds=60)
+    c.set("hot1", 1)
+    c.set("hot2", 2)
+    for _ in range(5):
+        c.get("hot1")
+        c.get("hot2")
+    c.get("cold")  # single miss
+    c.set("cold", 3)
+    assert c.get("cold") is None
+    assert c.get("hot1") == 1 and c.get("hot2") == 2
+
+def test_sharded_cache_respects_capacity():
+    c = TTLCache(max_items=512, ttl_seconds=60)
+    for i in range(2000):
+        c.set(("k", i), i)
+    assert len(c) <= 512
+    assert c.get(("k", 1999)) == 1999
+
+def test_get_or_fetch_coalesces_concurrent_misses():
+    c = TTLCache(max_items=16, ttl_seconds=60)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "v"
+
+    async def run():
+        return await asyncio.gather(*(c.get_or_fetch("k", fetch) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["v"] * 5
+    assert len(calls) == 1
+    assert c.get("k") == "v"
+
+def test_get_or_fetch_survives_first_caller_cancellation():
+    c = TTLCache(max_items=16, ttl_seconds=60)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "v"
+
+    async def run():
+        owner = asyncio.create_task(c.get_or_fetch("k", fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(c.get_or_fetch("k", fetch))
+        await asyncio.sleep(0)
+        owner.cancel()
+        result = await waiter
+        return owner, waiter, result
+
+    owner, waiter, result = asyncio.run(run())
+    assert owner.cancelled()
+    assert not waiter.cancelled() and result == "v"
+    assert len(calls) == 1
+    assert c.get("k") == "v"
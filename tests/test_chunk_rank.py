@@ -9,6 +9,11 @@ def test_sentence_split_and_chunking():
     assert len(chunks) >= 2
     assert all("text" in c and "start_char" in c for c in chunks)
 
+def test_sentence_split_boundaries():
+    s = "  One.  Two!\nThree? e.g.x stays.Trailing "
+    assert split_sentences(s) == ["One.", "Two!", "Three?", "e.g.x stays.Trailing"]
+    assert split_sentences("   ") == []
+
 def test_bm25_basic_signal():
     docs = [
         "cats purr softly and sleep a lot",
@@ -19,3 +24,37 @@ def test_bm25_basic_signal():
     scores = bm25_scores(q, docs)
     # doc 0 and 2 should outrank the dog doc
     assert scores[0] > scores[1] or scores[2] > scores[1]
+
+def test_bm25_edge_cases():
+    assert bm25_scores("cats", []) == []
+    assert bm25_scores("", ["cats purr"]) == [0.0]
+    docs = ["cats purr", "dogs bark"]
+    once, twice = bm25_scores("cats", docs), bm25_scores("cats cats", docs)
+    assert twice[0] == 2 * once[0] and twice[1] == 0.0
+
+def test_bm25_accepts_pretokenized_docs():
+    from app.textproc import tokenize_lower
+    docs = ["cats purr softly", "dogs bark loudly"]
+    assert bm25_scores("cats", docs, doc_tokens=[tokenize_lower(d) for d in docs]) == bm25_scores("cats", docs)
+
+def test_chunk_offsets_slice_normalized_text():
+    from app.textproc import normalize_whitespace
+    s = "Alpha beats  beta. Gamma is neutral!\nDelta? Epsilon continues. Zeta ends."
+    norm = normalize_whitespace(s)
+    chunks = chunk_by_chars(s, max_chars=40, overlap=8)
+    assert chunks[0]["start_char"] == 0 and chunks[-1]["end_char"] == len(norm)
+    assert all(norm[c["start_char"]:c["end_char"]] == c["text"] for c in chunks)
+
+def test_top_k_indices_matches_stable_sort():
+    from app.ranking import top_k_indices
+    scores = [0.2, 0.9, 0.5, 0.9, 0.1, 0.5]
+    expected = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    for k in range(len(scores) + 2):
+        assert top_k_indices(scores, k) == expected[:k]
+
+def test_unique_with_inverse_round_trips():
+    from app.ranking import unique_with_inverse
+    texts = ["b", "a", "b", "c", "a"]
+    uniq, inverse = unique_with_inverse(texts)
+    assert uniq == ["b", "a", "c"]
+    assert [uniq[i] for i in inverse] == texts
@@ -0,0 +1,142 @@
+# tests/test_embedding.py
+import asyncio
+import numpy as np
+import app.embedding as embedding
+from app.embedding import BatchingEmbedder
+
+def test_batching_embedder_coalesces_and_splits(monkeypatch):
+    calls = []
+
+    async def fake_embed(texts):
+        calls.append(list(texts))
+        return np.array([[float(len(t))] for t in texts], dtype=np.float16)
+
+    monkeypatch.setattr(embedding, "embed_texts", fake_embed)
+    b = BatchingEmbedder(max_batch=256, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(b.submit(["a", "bb"]), b.submit(["ccc"]))
+
+    first, second = asyncio.run(run())
+    assert calls == [["a", "bb", "ccc"]]
+    assert first.ravel().tolist() == [1.0, 2.0]
+    assert second.ravel().tolist() == [3.0]
+
+def test_batching_embedder_propagates_unavailable(monkeypatch):
+    async def fake_embed(texts):
+        return None
+
+    monkeypatch.setattr(embedding, "embed_texts", fake_embed)
+    b = BatchingEmbedder(max_batch=1, max_wait_ms=5)
+    assert asyncio.run(b.submit(["a"])) is None
+
+def test_embed_cached_only_sends_misses(monkeypatch):
+    from app.config import settings
+    calls = []
+
+    async def fake_embed(texts):
+        calls.append(list(texts))
+        return np.array([[float(len(t))] for t in texts], dtype=np.float16)
+
+    monkeypatch.setattr(embedding, "embed_texts", fake_embed)
+    monkeypatch.setattr(settings, "openai_api_key", "test")
+
+    first = asyncio.run(embedding.embed_cached(["cached-a", "cached-bb"]))
+    second = asyncio.run(embedding.embed_cached(["cached-bb", "cached-ccc"]))
+    assert calls == [["cached-a", "cached-bb"], ["cached-ccc"]]
+    assert np.allclose(first.dequantize().ravel(), [8.0, 9.0])
+    assert np.allclose(second.dequantize().ravel(), [9.0, 10.0])
+
+def test_int8_cosine_tracks_float(monkeypatch):
+    monkeypatch.setattr(embedding, "_SCORE_BLOCK", 16)  # exercise the blockwise widening
+    rng = np.random.default_rng(0)
+    M = rng.standard_normal((64, 256)).astype(np.float32)
+    M /= np.linalg.norm(M, axis=1, keepdims=True)
+    q = M[3]
+    exact = embedding.cosine_to_query(q, M)
+    approx = embedding.cosine_to_query(q, embedding.quantize_rows_int8(M))
+    assert approx.dtype == np.float32
+    assert np.abs(exact - approx).max() < 5e-3
+    assert int(np.argmax(approx)) == 3
+
+def test_client_rebuilt_after_aclose():
+    async def cycle():
+        first = embedding._get_client()
+        await embedding.aclose()
+        second = embedding._get_client()
+        return first, second
+
+    first, second = asyncio.run(cycle())
+    assert first.is_closed
+    assert second is not first
+
+def test_client_closed_when_its_loop_ends():
+    async def grab():
+        return embedding._get_client()
+
+    first = asyncio.run(grab())
+    second = asyncio.run(grab())
+    assert second is not first
+    assert first.is_closed and second.is_closed  # no pool outlives its loop
+
+def test_batching_embedder_caps_upstream_calls(monkeypatch):
+    calls = []
+
+    async def fake_embed(texts):
+        calls.append(list(texts))
+        if "big-1" in texts:
+            return None  # e.g. upstream rejects the oversized request's tokens
+        return np.array([[float(len(t))] for t in texts], dtype=np.float16)
+
+    monkeypatch.setattr(embedding, "embed_texts", fake_embed)
+    b = BatchingEmbedder(max_batch=2, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(
+            b.submit(["a"]), b.submit(["big-0", "big-1", "big-2"]), b.submit(["cc"])
+        )
+
+    small, big, other = asyncio.run(run())
+    assert all(len(c) <= 2 for c in calls)
+    assert big is None
+    assert small.ravel().tolist() == [1.0]
+    assert other.ravel().tolist() == [2.0]
+
+def test_batching_embedder_reassembles_split_caller(monkeypatch):
+    async def fake_embed(texts):
+        return np.array([[float(len(t))] for t in texts], dtype=np.float16)
+
+    monkeypatch.setattr(embedding, "embed_texts", fake_embed)
+    b = BatchingEmbedder(max_batch=2, max_wait_ms=5)
+    out = asyncio.run(b.submit(["a", "bb", "ccc", "dddd", "eeeee"]))
+    assert out.ravel().tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+def test_batching_embedder_recovers_from_a_finished_loop(monkeypatch):
+    async def fake_embed(texts):
+        return np.array([[float(len(t))] for t in texts], dtype=np.float16)
+
+    monkeypatch.setattr(embedding, "embed_texts", fake_embed)
+    b = BatchingEmbedder(max_batch=256, max_wait_ms=50)
+
+    async def abandon():
+        # loop ends while the submit is still waiting on the flush timer
+        asyncio.get_running_loop().create_task(b.submit(["orphan"]))
+        await asyncio.sleep(0)
+
+    async def run():
+        return await asyncio.wait_for(b.submit(["a", "bb"]), timeout=2)
+
+    asyncio.run(abandon())
+    assert asyncio.run(run()).ravel().tolist() == [1.0, 2.0]
+
+def test_batching_embedder_resolves_callers_on_error(monkeypatch):
+    async def fake_embed(texts):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(embedding, "embed_texts", fake_embed)
+    b = BatchingEmbedder(max_batch=1, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.wait_for(b.submit(["a"]), timeout=2)
+
+    assert asyncio.run(run()) is None
@@ -2,3 +2,26 @@
 from app.ranking import freshness_score
 def test_freshness_monotonic():
     assert freshness_score(2025, 2025, 5.0) > freshness_score(2015, 2025, 5.0)
+
+def test_freshness_vectorized_matches_scalar():
+    import numpy as np
+    from app.ranking import freshness_scores_np
+    years = [2025, 2015, None, 2030]
+    got = freshness_scores_np(np.array(years, dtype=np.float64), 2025, 5.0)
+    assert np.allclose(got, [freshness_score(y, 2025, 5.0) for y in years])
+
+def test_current_year_matches_utc_clock():
+    import datetime
+    from app.ranking import current_year
+    assert current_year() == datetime.datetime.now(datetime.timezone.utc).year
+    assert current_year() == current_year()
+
+def test_score_groups_matches_per_chunk_blend():
+    import numpy as np
+    from app.ranking import blend_with_freshness, freshness_score, score_groups
+    scores = [0.9, 0.1, 0.5, 0.3]
+    years, boosts, counts = [2024, None], [1.0, 1.5], [3, 1]
+    fresh = [freshness_score(2024, 2025, 5.0)] * 3 + [0.5]
+    expected = [s * b for s, b in zip(blend_with_freshness(scores, fresh, 0.3), [1.0, 1.0, 1.0, 1.5])]
+    got = score_groups(scores, years, boosts, counts, 2025, 5.0, 0.3)
+    assert np.allclose(got, expected)
@@ -0,0 +1,16 @@
+# tests/test_metrics.py
+from app.metrics import Metrics
+
+def test_p95_tracks_uniform_stream():
+    m = Metrics()
+    for v in range(1, 1001):
+        m.observe_ms("t", float(v))
+    p95 = m.snapshot()["latency_p95_ms"]["t"]
+    assert 930 <= p95 <= 970
+
+def test_histogram_keys_are_capped():
+    m = Metrics()
+    for i in range(Metrics.MAX_KEYS + 10):
+        m.observe_ms(f"k{i}", 1.0)
+    assert len(m.histos) == Metrics.MAX_KEYS
+    assert m.counters["metrics.dropped"] == 10
@@ -0,0 +1,14 @@
+# tests/test_obs.py
+import io
+import sys
+from fastapi.testclient import TestClient
+from app.main import app
+from app.metrics import metrics
+
+def test_request_log_falls_back_to_text_stdout(monkeypatch):
+    out = io.StringIO()  # no .buffer, like some replaced/captured streams
+    monkeypatch.setattr(sys, "stdout", out)
+    r = TestClient(app).get("/health")
+    assert r.status_code == 200
+    assert '"path":"/health"' in out.getvalue()
+    assert "http.latency.GET./health" in metrics.snapshot()["latency_p95_ms"]
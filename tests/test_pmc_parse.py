@@ -19,3 +19,31 @@ def test_parse_pmc_sections_basic():
     assert "Methods" in sec and "Results" in sec
     assert "zebrafish" in sec["Methods"]
     assert "swim" in sec["Results"]
+
+SAMPLE_PMC_NS = """
+<pmc-articleset>
+<article xmlns="https://jats.nlm.nih.gov/ns/archiving/1.3/">
+  <front><article-meta>
+    <article-id pub-id-type="pmcid">PMC1234</article-id>
+  </article-meta></front>
+  <body>
+    <sec sec-type="results"><title>Findings</title><p>Mice ran faster.</p>
+      <sec><title>Subgroup</title><p>Older mice too.</p></sec>
+    </sec>
+  </body>
+</article>
+</pmc-articleset>
+"""
+
+def test_parse_pmc_sections_namespaced_nested():
+    m = NCBIClient.parse_pmc_sections(SAMPLE_PMC_NS)
+    assert m["1234"]["Results"] == "Mice ran faster. Older mice too."
+
+def test_parse_pmc_sections_inline_markup_and_captions():
+    xml = (
+        b"<article><front><article-id pub-id-type='pmcid'>PMC7</article-id></front><body>"
+        b"<sec><fig><caption><title>Results overview</title></caption></fig>"
+        b"<title>Methods</title><p>Dose <italic>10 mg</italic> daily<xref>1</xref>.</p></sec>"
+        b"</body></article>"
+    )
+    assert NCBIClient.parse_pmc_sections(xml) == {"7": {"Methods": "Dose 10 mg daily1."}}
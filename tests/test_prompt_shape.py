@@ -12,3 +12,17 @@ def test_build_messages_shape():
     assert isinstance(msgs, list) and len(msgs) >= 2
     roles = [m["role"] for m in msgs]
     assert "system" in roles and "user" in roles
+
+def test_build_messages_evidence_block():
+    msgs = build_messages(
+        question=" Q? ",
+        contexts=[
+            {"pmid": "1", "pmcid": "99", "title": " T1 ", "text": " body one ", "section": "Results"},
+            {"pmid": "2", "title": None, "text": "body two"},
+        ],
+    )
+    user = next(m["content"] for m in msgs if m["role"] == "user")
+    assert user.endswith(
+        "[PMCID:PMC99] T1 — Section: Results\nbody one\n\n[PMID:2] \nbody two"
+    )
+    assert user.startswith("Question:\nQ?\n\n")
@@ -24,3 +24,49 @@ def test_parse_pubmed_abstracts_merges_segments():
     assert "Cats are mysterious." in parsed["12345678"]
     assert "We observed 10 cats." in parsed["12345678"]
     assert "They ignored us." in parsed["12345678"]
+
+def test_parse_pubmed_abstracts_accepts_response_bytes():
+    assert NCBIClient.parse_pubmed_abstracts(SAMPLE_EFETCH_XML.encode("utf-8")) == \
+        NCBIClient.parse_pubmed_abstracts(SAMPLE_EFETCH_XML)
+
+def test_parse_pubmed_abstracts_stream_matches_sync_parse():
+    import asyncio
+    import gzip
+    import httpx
+
+    body = gzip.compress(SAMPLE_EFETCH_XML.encode("utf-8"))
+
+    def handler(request):
+        return httpx.Response(200, content=body, headers={"Content-Encoding": "gzip"})
+
+    async def run():
+        client = NCBIClient(api_key=None, email="test@example.com", tool="tests")
+        await client._client.aclose()
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with client:
+            return await client.parse_pubmed_abstracts_stream(["12345678", "stream-test"])
+
+    assert asyncio.run(run()) == NCBIClient.parse_pubmed_abstracts(SAMPLE_EFETCH_XML)
+
+def test_shared_client_is_per_event_loop():
+    import asyncio
+    from app import ncbi
+
+    async def grab():
+        a, b = ncbi.get_client(), ncbi.get_client()
+        return a, b
+
+    first, again = asyncio.run(grab())
+    second, _ = asyncio.run(grab())
+    assert first is again
+    assert second is not first  # the first loop is closed; its pooled connections are unusable
+    # each loop closed its own client on shutdown, so no stale pool is left open
+    assert first._client.is_closed and second._client.is_closed
+
+    async def close():
+        client = ncbi.get_client()
+        await ncbi.aclose_client()
+        return client, ncbi.get_client()
+
+    closed, fresh = asyncio.run(close())
+    assert closed._client.is_closed and fresh is not closed
@@ -0,0 +1,27 @@
+# tests/test_select.py
+import asyncio
+import app.routers_pubmed as routers_pubmed
+
+class _NoAbstractsClient:
+    async def esearch(self, term, retmax, sort):
+        return ["1"]
+
+    async def fetch_pubmed_bundle(self, pmids, with_pmc=True):
+        return [{"pmid": "1", "abstract": ""}], {}
+
+def test_select_early_return_cancels_query_embedding(monkeypatch):
+    async def slow_embed_query(text):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(routers_pubmed, "get_client", lambda: _NoAbstractsClient())
+    monkeypatch.setattr(routers_pubmed, "embed_query", slow_embed_query)
+
+    async def run():
+        out = await routers_pubmed.pubmed_select(term="x", use_embeddings=True)
+        await asyncio.sleep(0)
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        return out, pending
+
+    out, pending = asyncio.run(run())
+    assert out["chunks"] == []
+    assert pending == []